@@ -31,9 +31,13 @@ setup(
     author_email='anselm.kruis@atos.net',
     url='https://github.com/stackless-dev/stackless-testsuite',
     packages=['stackless_testsuite',
+              'stackless_testsuite.bench',
               'stackless_testsuite.v3_1',
+              'stackless_testsuite.v3_1.bench',
               'stackless_testsuite.v3_1.tasklet',
-              'stackless_testsuite.v3_1.channel'],
+              'stackless_testsuite.v3_1.tasklet.bench',
+              'stackless_testsuite.v3_1.channel',
+              'stackless_testsuite.v3_1.channel.bench'],
 
     long_description="""
 Test-Suit for Stackless-Python
@@ -0,0 +1,485 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Benchmark support
+
+A benchmark function executes its workload *loops* times and returns the
+elapsed time in seconds, measured with :func:`clock`. Setup and teardown
+code must not be timed. Benchmarks with the measure "slices" return the
+number of watchdog slices of a fixed instruction budget instead. This cost
+is nearly independent of the load of the host. A benchmark function may
+also return a tuple ``(seconds, metrics)``, where *metrics* is a dictionary
+of additional measured values. If a benchmark can't run on the current
+interpreter, the function raises :class:`BenchmarkSkipped`.
+
+Each variant runs a few untimed warmup runs and then several timed runs.
+Optionally the number of loops gets calibrated first, until a single run
+takes a minimal time. The statistics reject outliers (Tukey's fences) and
+include a confidence interval of the mean. A benchmark function runs on
+the main tasklet or in a tasklet, like the tests of
+:class:`AsTaskletTestCase`.
+
+Benchmark modules named ``bench*.py`` live in ``bench`` packages next to
+the tests. Each defines a list BENCHMARKS. ``python -m
+stackless_testsuite.bench`` discovers and runs all of them.
+
+Results are written as JSON lines, one object per benchmark variant.
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import argparse
+import fnmatch
+import gc
+import importlib
+import itertools
+import json
+import math
+import os
+import platform
+import re
+import sys
+import time
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import stackless
+from stackless_testsuite import profiling, store, trace
+from stackless_testsuite.util import kill_scheduled_tasklets, softswitch_from_environment
+
+try:
+    clock = time.perf_counter
+except AttributeError:
+    # Python 2.7
+    clock = time.clock if sys.platform == "win32" else time.time
+
+try:
+    clock_ns = time.perf_counter_ns
+except AttributeError:
+    def clock_ns():
+        return int(clock() * 1e9)
+
+try:
+    xrange
+except NameError:
+    xrange = range  # @ReservedAssignment
+
+
+TOP_LEVEL_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+START_DIR = os.path.join(TOP_LEVEL_DIR, "stackless_testsuite")
+
+MODULE_FILE_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*\.py$")
+
+# what a benchmark function returns: seconds or a number of watchdog slices
+MEASURES = ("time", "slices")
+
+# where a benchmark function may run, see Benchmark
+CONTEXTS = ("main", "tasklet")
+MAIN_ONLY = ("main",)
+
+# Tukey's fences for the outlier rejection
+OUTLIER_FENCE = 1.5
+
+# the confidence level of the interval of the mean
+CONFIDENCE = 0.95
+
+# the upper limit of the loop calibration
+MAX_LOOPS = 10 ** 9
+
+
+class BenchmarkSkipped(Exception):
+    """Raised by a benchmark function, that can't run on this interpreter"""
+
+
+def softswitch_enabled():
+    """Return the current soft switching state"""
+    try:
+        enable_softswitch = stackless.enable_softswitch
+    except AttributeError:
+        return False
+    return bool(enable_softswitch(None))
+
+
+def environment():
+    """Describe the interpreter, that executes the benchmarks"""
+    return {"python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "executable": sys.executable,
+            "platform": platform.platform(),
+            "softswitch": softswitch_enabled(),
+            "revision": store.git_revision(),
+            }
+
+
+def percentile(sorted_samples, p):
+    """Return the *p*-th percentile of *sorted_samples* (nearest rank)"""
+    if not sorted_samples:
+        return None
+    rank = int(math.ceil(p / 100.0 * len(sorted_samples)))
+    return sorted_samples[min(max(rank, 1), len(sorted_samples)) - 1]
+
+
+def rss():
+    """Return the resident set size of the process in bytes or None"""
+    if resource is None:
+        return None
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+    return pages * resource.getpagesize()
+
+
+def cleanup():
+    """Kill all tasklets left in the run queue by a benchmark
+
+    Works like :meth:`StacklessTestCase.tearDown`.
+    """
+    kill_scheduled_tasklets()
+    run_count = stackless.getruncount()
+    if run_count != 1:
+        raise RuntimeError("Leakage from benchmark, with %d tasklets still in the scheduler" % (run_count - 1))
+
+
+def reject_outliers(samples, k=OUTLIER_FENCE):
+    """Return the samples inside Tukey's fences and the number of rejected samples
+
+    The fences are *k* interquartile ranges below the first and above the
+    third quartile. Less than four samples are returned unchanged.
+    """
+    if len(samples) < 4:
+        return list(samples), 0
+    ordered = sorted(samples)
+    q1 = percentile(ordered, 25)
+    q3 = percentile(ordered, 75)
+    low = q1 - k * (q3 - q1)
+    high = q3 + k * (q3 - q1)
+    kept = [x for x in samples if low <= x <= high]
+    return kept, len(samples) - len(kept)
+
+
+def confidence_interval(samples, confidence=CONFIDENCE):
+    """Return (low, high) of the confidence interval of the mean of *samples* or None"""
+    if len(samples) < 2:
+        return None
+    mean, var = store.mean_var(samples)
+    half = store.t_quantile(confidence, len(samples) - 1) * math.sqrt(var / len(samples))
+    return mean - half, mean + half
+
+
+def call_in_tasklet(func, *args, **kwargs):
+    """Call *func* in a new tasklet and return its result
+
+    Works like :meth:`AsTaskletTestCase.run`: the main tasklet blocks on a
+    channel, until the tasklet sends the result or the exception.
+    """
+    c = stackless.channel()
+    c.preference = 1  # sender priority
+
+    def helper():
+        try:
+            c.send(func(*args, **kwargs))
+        except:
+            c.send_throw(*sys.exc_info())
+    stackless.tasklet(helper)()
+    return c.receive()
+
+
+class Benchmark(object):
+    """A benchmark function and the parameters it gets called with
+
+    *params* maps parameter names to sequences of values. The benchmark
+    runs once for every combination of values. *unit* names the operation
+    counted by the benchmark and *ops_per_loop* the number of operations
+    in a single loop. If *ops_per_loop* is callable, it gets called with the
+    parameters of the variant. *contexts* lists where the function may run:
+    "main" on the main tasklet or "tasklet" in a tasklet created by
+    :func:`call_in_tasklet`. Functions, that depend on being the main
+    tasklet, run on the main tasklet only. *measure* is one of
+    :data:`MEASURES`.
+    """
+
+    def __init__(self, name, func, loops, unit="op", ops_per_loop=1, params=None, contexts=MAIN_ONLY,
+                 measure="time"):
+        self.name = name
+        self.func = func
+        self.loops = loops
+        self.unit = unit
+        self.ops_per_loop = ops_per_loop
+        self.params = dict(params or {})
+        self.contexts = tuple(contexts)
+        self.measure = measure
+
+    def __repr__(self):
+        return "<Benchmark %s>" % (self.name,)
+
+    def variants(self):
+        names = sorted(self.params)
+        for values in itertools.product(*[self.params[n] for n in names]):
+            yield dict(zip(names, values))
+
+    def run_once(self, loops, params, context="main"):
+        gc_enabled = gc.isenabled()
+        gc.collect()
+        gc.disable()
+        try:
+            if context == "tasklet":
+                result = call_in_tasklet(self.func, loops, **params)
+            else:
+                result = self.func(loops, **params)
+        finally:
+            if gc_enabled:
+                gc.enable()
+            cleanup()
+        if isinstance(result, tuple):
+            return result
+        return result, {}
+
+    def calibrate(self, params, loops, min_time, context="main"):
+        """Increase *loops* until a single run takes at least *min_time* seconds"""
+        while loops < MAX_LOOPS:
+            seconds = self.run_once(loops, params, context)[0]
+            if seconds >= min_time:
+                break
+            # aim a little above min_time, but grow by 2 to 10 times per step
+            factor = 1.2 * min_time / seconds if seconds > 0 else 10.0
+            loops = min(MAX_LOOPS, int(loops * min(10.0, max(2.0, factor))))
+        return loops
+
+    def run(self, params, loops=None, repeat=5, warmup=0, min_time=None, context="main"):
+        """Run a single variant and return the result record
+
+        Run the variant *warmup* times untimed, then *repeat* times timed.
+        If *min_time* is given, calibrate the number of loops first. The
+        statistics except "best" and "rate" ignore outliers. For the
+        measure "slices", the "times" are slice counts and calibration is
+        pointless.
+        """
+        if loops is None:
+            loops = self.loops
+        times = []
+        metrics = {}
+        try:
+            if min_time and self.measure == "time":
+                loops = self.calibrate(params, loops, min_time, context)
+            for i in xrange(warmup):  # @UnusedVariable
+                self.run_once(loops, params, context)
+            for i in xrange(repeat):  # @UnusedVariable
+                seconds, m = self.run_once(loops, params, context)
+                times.append(seconds)
+                for k, v in m.items():
+                    metrics.setdefault(k, []).append(v)
+        except BenchmarkSkipped as e:
+            return {"benchmark": self.name,
+                    "params": params,
+                    "context": context,
+                    "skipped": str(e),
+                    }
+        best = min(times)
+        kept, outliers = reject_outliers(times)
+        mean, var = store.mean_var(kept)
+        ops_per_loop = self.ops_per_loop
+        if callable(ops_per_loop):
+            ops_per_loop = ops_per_loop(params)
+        ops = loops * ops_per_loop
+        return {"benchmark": self.name,
+                "params": params,
+                "context": context,
+                "measure": self.measure,
+                "loops": loops,
+                "repeat": repeat,
+                "warmup": warmup,
+                "unit": self.unit,
+                "ops": ops,
+                "times": times,
+                "best": best,
+                "mean": mean,
+                "stdev": math.sqrt(var),
+                "outliers": outliers,
+                "ci": confidence_interval(kept),
+                "confidence": CONFIDENCE,
+                "rate": ops / best if best > 0 else None,
+                "metrics": metrics,
+                }
+
+
+class Reporter(object):
+    """Write benchmark results as JSON lines"""
+
+    def __init__(self, stream=None, store_file=None):
+        self.stream = stream if stream is not None else sys.stdout
+        self.environment = environment()
+        self.store_file = store_file
+        self.run_id = store.new_run_id()
+
+    def report(self, record):
+        record = dict(record)
+        record["env"] = self.environment
+        self.stream.write(json.dumps(record, sort_keys=True))
+        self.stream.write("\n")
+        self.stream.flush()
+        # traced timings don't belong into the performance history
+        if self.store_file and not record.get("traced"):
+            store.append(self.store_file, [store.from_benchmark(record, self.run_id, self.environment)])
+
+
+def discover(start_dir=START_DIR, pattern="bench*.py", top_level_dir=TOP_LEVEL_DIR):
+    """Return the benchmarks of all modules below *start_dir* matching *pattern*
+
+    Works like unittest discovery: descend into packages only and import
+    the modules by their dotted name relative to *top_level_dir*. The
+    benchmarks of a module are in its module level list BENCHMARKS.
+    """
+    start_dir = os.path.abspath(start_dir)
+    top_level_dir = os.path.abspath(top_level_dir)
+    if top_level_dir not in sys.path:
+        sys.path.insert(0, top_level_dir)
+    benchmarks = []
+    seen = set()
+    for dirpath, dirnames, filenames in os.walk(start_dir):
+        if dirpath != start_dir and not os.path.isfile(os.path.join(dirpath, "__init__.py")):
+            # not a package
+            del dirnames[:]
+            continue
+        dirnames.sort()
+        package = os.path.relpath(dirpath, top_level_dir).replace(os.sep, ".")
+        prefix = "" if package == os.curdir else package + "."
+        for filename in sorted(filenames):
+            if not MODULE_FILE_RE.match(filename) or not fnmatch.fnmatch(filename, pattern):
+                continue
+            module = importlib.import_module(prefix + filename[:-3])
+            for benchmark in getattr(module, "BENCHMARKS", ()):
+                if benchmark.name not in seen:
+                    seen.add(benchmark.name)
+                    benchmarks.append(benchmark)
+    return benchmarks
+
+
+def run_benchmarks(benchmarks, reporter, pattern=None, scale=1.0, repeat=5, profile=None, profile_mode="cprofile",
+                   warmup=0, min_time=None, contexts=MAIN_ONLY, measures=MEASURES, trace_file=None,
+                   trace_mode="record"):
+    """Run all variants of *benchmarks* and report the results
+
+    Run only benchmarks with one of the given *measures*. Every benchmark
+    runs in those of *contexts*, it supports. If *profile*
+    is a directory, profile every variant and write the profiles to
+    *profile*, see :mod:`stackless_testsuite.profiling`. If *trace_file*
+    is given, record or replay (*trace_mode*) the scheduler events of every
+    variant, see :mod:`stackless_testsuite.trace`.
+    """
+    if pattern is not None:
+        pattern = re.compile(pattern)
+    for benchmark in benchmarks:
+        if pattern is not None and not pattern.search(benchmark.name):
+            continue
+        if benchmark.measure not in measures:
+            continue
+        loops = max(1, int(benchmark.loops * scale))
+        for context in contexts:
+            if context not in benchmark.contexts:
+                continue
+            for params in benchmark.variants():
+                name = benchmark.name + "".join(".%s=%s" % (k, params[k]) for k in sorted(params))
+                if context != "main":
+                    name += "." + context
+                with trace.Session(trace_file, name, trace_mode) as tracer:
+                    with profiling.Session(profile, name, profile_mode):
+                        record = benchmark.run(params, loops=loops, repeat=repeat, warmup=warmup,
+                                               min_time=min_time, context=context)
+                if trace_file is not None:
+                    # the callbacks slow down every switch
+                    record["traced"] = True
+                divergence = tracer.divergence()
+                if divergence is not None:
+                    record["trace_divergence"] = divergence
+                reporter.report(record)
+
+
+def main(benchmarks=None, argv=None, description=None):
+    """Command line interface for a collection of benchmarks
+
+    If *benchmarks* is None, discover the benchmarks, see :func:`discover`.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("-o", "--output", default=None,
+                        help="append the JSON lines to OUTPUT instead of writing them to stdout")
+    parser.add_argument("-k", "--filter", default=None, metavar="REGEX",
+                        help="run only benchmarks whose name matches REGEX")
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+                        help="number of timed runs per variant (default: %(default)s)")
+    parser.add_argument("-w", "--warmup", type=int, default=1,
+                        help="number of untimed runs per variant before the timed runs (default: %(default)s)")
+    parser.add_argument("-s", "--scale", type=float, default=1.0,
+                        help="multiply the number of loops by SCALE (default: %(default)s)")
+    parser.add_argument("--min-time", type=float, default=None, metavar="SECONDS",
+                        help="calibrate the number of loops, until a run takes at least SECONDS")
+    parser.add_argument("--context", choices=CONTEXTS + ("all",), default="main",
+                        help="run the benchmarks on the main tasklet or in a tasklet (default: %(default)s)")
+    parser.add_argument("--measure", choices=MEASURES + ("all",), default="all",
+                        help="run only benchmarks measuring time or watchdog slices (default: %(default)s)")
+    parser.add_argument("--store", default=None, metavar="FILE",
+                        help="also append the results to the result store FILE, see stackless_testsuite.store")
+    parser.add_argument("--profile", default=None, metavar="DIR",
+                        help="profile the benchmarks and write the profiles to DIR")
+    parser.add_argument("--profile-mode", choices=profiling.MODES, default="cprofile",
+                        help="per tasklet cProfile or pure Python sampling profiler (default: %(default)s)")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--trace", default=None, metavar="FILE",
+                       help="record the scheduler events of every variant to FILE, see stackless_testsuite.trace")
+    group.add_argument("--replay", default=None, metavar="FILE",
+                       help="replay the recorded inputs from FILE and compare the scheduler events; "
+                       "use the options of the recording run without --min-time")
+    parser.add_argument("-l", "--list", action="store_true",
+                        help="list the benchmarks and exit")
+    if benchmarks is None:
+        parser.add_argument("--start-directory", default=START_DIR,
+                            help="directory to start the discovery (default: the stackless_testsuite package)")
+        parser.add_argument("-p", "--pattern", default="bench*.py",
+                            help="pattern to match benchmark modules (default: %(default)s)")
+        parser.add_argument("-t", "--top-level-directory", default=TOP_LEVEL_DIR,
+                            help="top level directory of the project (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    softswitch_from_environment()
+    if benchmarks is None:
+        benchmarks = discover(args.start_directory, args.pattern, args.top_level_directory)
+    contexts = CONTEXTS if args.context == "all" else (args.context,)
+    measures = MEASURES if args.measure == "all" else (args.measure,)
+
+    if args.list:
+        for benchmark in benchmarks:
+            if benchmark.measure in measures:
+                print(benchmark.name)
+        return 0
+
+    stream = open(args.output, "a") if args.output else None
+    try:
+        run_benchmarks(benchmarks, Reporter(stream, args.store), pattern=args.filter,
+                       scale=args.scale, repeat=args.repeat, profile=args.profile,
+                       profile_mode=args.profile_mode, warmup=args.warmup,
+                       min_time=args.min_time, contexts=contexts, measures=measures,
+                       trace_file=args.replay or args.trace, trace_mode="replay" if args.replay else "record")
+    finally:
+        if stream is not None:
+            stream.close()
+    return 0
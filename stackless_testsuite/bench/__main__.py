@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Discover and run all benchmarks
+
+Usage::
+   $ python -m stackless_testsuite.bench [-p "bench_*.py"] [-k REGEX] [-o results.jsonl]
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import sys
+from stackless_testsuite.bench import main
+
+if __name__ == "__main__":
+    sys.exit(main(description="Discover and run the benchmarks of the test suite"))
@@ -0,0 +1,457 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Systematic interleaving explorer
+
+Run a small tasklet program under a controlled scheduler and enumerate its
+distinct interleavings. A program is a function, that gets a :class:`Run`
+and creates the tasklets with :meth:`Run.spawn`, the channels with
+:meth:`Run.channel` and the shared variables with :meth:`Run.shared`. It
+may return a function, that checks the final state::
+
+    def lost_update(run):
+        v = run.shared(x=0)
+
+        def increment():
+            x = v.x
+            stackless.schedule()
+            v.x = x + 1
+
+        run.spawn(increment)
+        run.spawn(increment)
+
+        def check():
+            assert v.x == 2, v.x
+        return check
+
+The main tasklet keeps all other tasklets paused and runs one of them at a
+time. A step ends, when the tasklet calls stackless.schedule(), blocks or
+ends. With *preempt* N the step runs under stackless.run(N) and may also
+end after N instructions. In both modes only the chosen tasklet runs during
+a step. The channels have the preference 0, that is no channel operation
+switches on its own. The explorer tracks the methods send(), receive(),
+send_exception(), send_throw() and close() of the channels, but not the
+iteration over a channel.
+
+The explorer re-executes the program for every prefix of a schedule
+(stateless search). Two techniques keep the search tractable:
+
+- Partial-order reduction with sleep sets: steps, that access disjoint
+  shared variables and channels, are independent and only one of their
+  orders gets explored.
+- State hashing: a state already explored with a smaller sleep set gets
+  pruned. The state consists of the shared variables, the channel balances
+  and the frames (code position and simple local variables) of the
+  tasklets. Assign new values to shared variables instead of mutating them.
+
+Failures (exceptions in a tasklet or in the final check, deadlocks and
+schedules longer than *max_steps*) are reported with the schedule, a list of
+tasklet indices. :func:`replay` executes a schedule again.
+
+Usage::
+   $ python -m stackless_testsuite.explore mypackage.mymodule:lost_update
+   $ python -m stackless_testsuite.explore mypackage.mymodule:lost_update --replay 0,1,0,1
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import argparse
+import importlib
+import numbers
+import sys
+import traceback
+
+import stackless
+from stackless_testsuite.util import kill_scheduled_tasklets
+
+MAX_STEPS = 100
+
+# frames per tasklet in the state
+MAX_FRAMES = 30
+
+try:
+    SIMPLE_TYPES = (numbers.Number, type(None), basestring)  # @UndefinedVariable
+except NameError:
+    SIMPLE_TYPES = (numbers.Number, type(None), str, bytes)
+
+
+class Footprint(object):
+    """The shared variables and channels accessed by a step"""
+
+    def __init__(self):
+        self.reads = set()
+        self.writes = set()
+        self.channels = set()
+        # the step did something, that depends on everything
+        self.everything = False
+
+    def independent(self, other):
+        if self.everything or other.everything:
+            return False
+        if self.channels & other.channels:
+            return False
+        if self.writes & (other.reads | other.writes):
+            return False
+        return not (other.writes & self.reads)
+
+
+class Shared(object):
+    """Shared variables, the explorer tracks every access"""
+
+    def __init__(self, run, number, values):
+        object.__setattr__(self, "_run", run)
+        object.__setattr__(self, "_number", number)
+        object.__setattr__(self, "_values", values)
+
+    def __getattr__(self, name):
+        self._run.access((self._number, name), False)
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self._run.access((self._number, name), True)
+        self._values[name] = value
+
+
+class TrackedChannel(stackless.channel):
+    """A channel, that reports its operations to the explorer"""
+
+    def send(self, value):
+        self.run.access(("channel", self.number), None)
+        return super(TrackedChannel, self).send(value)
+
+    def receive(self):
+        self.run.access(("channel", self.number), None)
+        return super(TrackedChannel, self).receive()
+
+    def send_exception(self, exc, *args):
+        self.run.access(("channel", self.number), None)
+        return super(TrackedChannel, self).send_exception(exc, *args)
+
+    def send_throw(self, exc, value=None, tb=None):
+        self.run.access(("channel", self.number), None)
+        return super(TrackedChannel, self).send_throw(exc, value, tb)
+
+    def close(self):
+        self.run.access(("channel", self.number), None)
+        return super(TrackedChannel, self).close()
+
+
+def frame_signature(frame):
+    """Return the code positions and simple local variables of a tasklet"""
+    signature = []
+    while frame is not None and len(signature) < MAX_FRAMES:
+        local_vars = tuple(sorted((k, repr(v)) for k, v in frame.f_locals.items() if isinstance(v, SIMPLE_TYPES)))
+        signature.append((frame.f_code.co_filename, frame.f_code.co_name, frame.f_lineno, local_vars))
+        frame = frame.f_back
+    return tuple(signature)
+
+
+class Run(object):
+    """A single execution of a program under the control of the explorer"""
+
+    def __init__(self, program, preempt=None):
+        self.preempt = preempt
+        self.tasklets = []
+        self.channels = []
+        self.shared_objects = []
+        self.schedule = []
+        self.footprint = None
+        self.check = program(self)
+
+    #
+    # The interface for programs
+    #
+    def spawn(self, func, *args, **kwargs):
+        """Create a tasklet of the program"""
+        t = stackless.tasklet(func)(*args, **kwargs)
+        t.remove()
+        self.tasklets.append(t)
+        if self.footprint is not None:
+            self.footprint.everything = True
+        return t
+
+    def channel(self):
+        """Create a channel of the program"""
+        c = TrackedChannel()
+        c.preference = 0
+        c.run = self
+        # the number identifies the channel in all executions of the program
+        c.number = len(self.channels)
+        self.channels.append(c)
+        return c
+
+    def shared(self, **values):
+        """Create shared variables with the initial *values*"""
+        s = Shared(self, len(self.shared_objects), values)
+        self.shared_objects.append(s)
+        return s
+
+    def access(self, key, write):
+        footprint = self.footprint
+        if footprint is None:
+            return
+        if write is None:
+            footprint.channels.add(key)
+        elif write:
+            footprint.writes.add(key)
+        else:
+            footprint.reads.add(key)
+
+    #
+    # Control
+    #
+    def enabled(self):
+        """Return the indices of the tasklets, that can make a step"""
+        return [i for i, t in enumerate(self.tasklets) if t.alive and not t.blocked]
+
+    def blocked(self):
+        return [i for i, t in enumerate(self.tasklets) if t.alive and t.blocked]
+
+    def pause_all(self):
+        for t in self.tasklets:
+            if t.alive and t.scheduled and not t.blocked:
+                t.remove()
+
+    def step(self, index):
+        """Let tasklet *index* make a step and return its footprint"""
+        t = self.tasklets[index]
+        self.footprint = footprint = Footprint()
+        self.schedule.append(index)
+        try:
+            if self.preempt:
+                # the sentinel runs, as soon as the tasklet schedules, blocks
+                # or ends. It pauses the tasklets, and stackless.run() returns
+                t.insert()
+                sentinel = stackless.tasklet(self.pause_all)()
+                try:
+                    stackless.run(self.preempt)
+                finally:
+                    if sentinel.alive:
+                        sentinel.kill()
+            else:
+                t.run()
+        except:
+            footprint.everything = True
+            raise
+        finally:
+            self.footprint = None
+            self.pause_all()
+        return footprint
+
+    def state(self):
+        tasklets = tuple((t.alive, t.blocked, frame_signature(t.frame) if t.alive else ()) for t in self.tasklets)
+        shared = tuple(tuple(sorted((k, repr(v)) for k, v in s._values.items())) for s in self.shared_objects)
+        channels = tuple(c.balance for c in self.channels)
+        return tasklets, shared, channels
+
+    def abort(self):
+        for t in self.tasklets:
+            if t.alive:
+                t.kill()
+        kill_scheduled_tasklets()
+
+
+class Failure(object):
+    """A failing schedule"""
+
+    def __init__(self, schedule, kind, message):
+        self.schedule = list(schedule)
+        self.kind = kind
+        self.message = message
+
+    def __str__(self):
+        return "%s after schedule %s\n%s" % (self.kind, ",".join(str(i) for i in self.schedule), self.message)
+
+
+def format_exception(e):
+    return "".join(traceback.format_exception_only(type(e), e)).rstrip()
+
+
+class Explorer(object):
+    """Enumerate the interleavings of *program*"""
+
+    def __init__(self, program, preempt=None, max_steps=MAX_STEPS, reduction=True, hashing=True,
+                 stop_on_failure=True):
+        self.program = program
+        self.preempt = preempt
+        self.max_steps = max_steps
+        self.reduction = reduction
+        self.hashing = hashing
+        self.stop_on_failure = stop_on_failure
+        self.visited = {}
+        self.failures = []
+        self.executions = 0
+        self.paths = 0
+        self.states = 0
+        self.pruned = 0
+
+    def fail(self, schedule, kind, message):
+        self.failures.append(Failure(schedule, kind, message))
+
+    def execute(self, schedule):
+        """Execute the program along *schedule*. Return the run and the footprint of the last step"""
+        self.executions += 1
+        run = Run(self.program, self.preempt)
+        footprint = None
+        try:
+            for index in schedule:
+                footprint = run.step(index)
+        except:
+            run.abort()
+            raise
+        return run, footprint
+
+    def visit(self, schedule, candidates):
+        """Explore the schedules starting with *schedule*
+
+        *candidates* are the steps, that may go into the sleep set. Return
+        the footprint of the last step of *schedule*.
+        """
+        try:
+            run, last = self.execute(schedule)
+        except Exception as e:
+            self.fail(schedule, "exception", format_exception(e))
+            last = Footprint()
+            last.everything = True
+            return last
+        try:
+            sleep = {}
+            if self.reduction and last is not None:
+                sleep = dict((i, fp) for i, fp in candidates.items() if fp.independent(last))
+            enabled = run.enabled()
+            if not enabled:
+                self.paths += 1
+                blocked = run.blocked()
+                if blocked:
+                    self.fail(schedule, "deadlock", "the tasklets %s are blocked" % (blocked,))
+                elif run.check is not None:
+                    try:
+                        run.check()
+                    except Exception as e:
+                        self.fail(schedule, "exception", format_exception(e))
+                return last
+            if len(schedule) >= self.max_steps:
+                self.fail(schedule, "step limit", "the schedule exceeds %d steps" % (self.max_steps,))
+                return last
+            if self.hashing:
+                state = run.state()
+                seen = self.visited.setdefault(state, [])
+                if any(s <= set(sleep) for s in seen):
+                    self.pruned += 1
+                    return last
+                if not seen:
+                    self.states += 1
+                seen.append(frozenset(sleep))
+        finally:
+            run.abort()
+        done = {}
+        for index in enabled:
+            if index in sleep:
+                continue
+            children = dict(sleep)
+            children.update(done)
+            done[index] = self.visit(schedule + [index], children)
+            if self.failures and self.stop_on_failure:
+                break
+        return last
+
+    def explore(self):
+        """Explore the program and return the list of failures"""
+        self.visit([], {})
+        return self.failures
+
+    def summary(self):
+        return ("%d executions, %d complete paths, %d states, %d pruned by state hashing, %d failures" %
+                (self.executions, self.paths, self.states, self.pruned, len(self.failures)))
+
+
+def explore(program, **kwargs):
+    """Explore *program* and return the explorer, see :class:`Explorer`"""
+    explorer = Explorer(program, **kwargs)
+    explorer.explore()
+    return explorer
+
+
+def replay(program, schedule, preempt=None):
+    """Execute *program* along *schedule* and check the final state
+
+    Exceptions of the tasklets and of the final check propagate.
+    """
+    run = Run(program, preempt)
+    try:
+        for index in schedule:
+            run.step(index)
+        if not run.enabled():
+            blocked = run.blocked()
+            if blocked:
+                raise RuntimeError("Deadlock: the tasklets %s are blocked" % (blocked,))
+            if run.check is not None:
+                run.check()
+    finally:
+        run.abort()
+    return run
+
+
+def load_program(name):
+    """Load a program given as "module:function" """
+    module, sep, function = name.partition(":")
+    if not sep:
+        raise ValueError("expected module:function, got %r" % (name,))
+    return getattr(importlib.import_module(module), function)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Explore the interleavings of a tasklet program")
+    parser.add_argument("program", help="the program as module:function")
+    parser.add_argument("--preempt", type=int, default=None, metavar="N",
+                        help="also preempt tasklets after N instructions using stackless.run(N)")
+    parser.add_argument("--max-steps", type=int, default=MAX_STEPS,
+                        help="maximal length of a schedule (default: %(default)s)")
+    parser.add_argument("--no-reduction", action="store_true", help="disable the partial-order reduction")
+    parser.add_argument("--no-hashing", action="store_true", help="disable the state hashing")
+    parser.add_argument("--all", action="store_true", help="don't stop at the first failure")
+    parser.add_argument("--replay", default=None, metavar="SCHEDULE",
+                        help="replay the comma separated list of tasklet indices")
+    args = parser.parse_args(argv)
+
+    program = load_program(args.program)
+    if args.replay is not None:
+        schedule = [int(i) for i in args.replay.split(",") if i.strip()]
+        try:
+            replay(program, schedule, args.preempt)
+        except Exception:
+            traceback.print_exc()
+            return 1
+        print("no failure")
+        return 0
+
+    explorer = explore(program, preempt=args.preempt, max_steps=args.max_steps,
+                       reduction=not args.no_reduction, hashing=not args.no_hashing,
+                       stop_on_failure=not args.all)
+    for failure in explorer.failures:
+        print(failure)
+    print(explorer.summary())
+    return 1 if explorer.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
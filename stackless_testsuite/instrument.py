@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Scheduler instrumentation of test cases
+
+Set the environment variable STACKLESS_TESTSUITE_INSTRUMENT to the name of
+a file to count the scheduler events of every StacklessTestCase. The test
+case installs a schedule callback and a channel callback while the test
+runs and appends one JSON line per test to the file::
+
+   {"id": ..., "switches": ..., "started": ..., "ended": ...,
+    "channel_ops": ..., "channel_blocks": ...}
+
+"started" counts tasklets, that run for the first time, "ended" counts
+tasklets, that finished or got killed. The callbacks are not part of the
+stackless API 3.1. If the implementation lacks them, nothing gets counted.
+
+Print the top offenders or compare two files with::
+   $ python -m stackless_testsuite.instrument [--top N] FILE [NEW_FILE]
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import argparse
+import json
+import os
+import sys
+import weakref
+
+COUNTERS = ("switches", "started", "ended", "channel_ops", "channel_blocks")
+
+INSTRUMENT_FILE = os.environ.get("STACKLESS_TESTSUITE_INSTRUMENT") or None
+
+
+class SchedulerCounter(object):
+    """Count scheduler events using stackless.set_schedule_callback and set_channel_callback"""
+
+    def __init__(self):
+        for name in COUNTERS:
+            setattr(self, name, 0)
+        self._seen = weakref.WeakKeyDictionary()
+        self._old_schedule_cb = self._old_channel_cb = None
+        self.installed = False
+
+    def schedule_cb(self, prev, next):
+        if prev is not None and next is not None:
+            self.switches += 1
+        if prev is not None and not prev.alive:
+            self.ended += 1
+        if next is not None and next not in self._seen:
+            self._seen[next] = True
+            if not next.is_main:
+                self.started += 1
+        if self._old_schedule_cb is not None:
+            self._old_schedule_cb(prev, next)
+
+    def channel_cb(self, channel, tasklet, sending, willblock):
+        self.channel_ops += 1
+        if willblock:
+            self.channel_blocks += 1
+        if self._old_channel_cb is not None:
+            self._old_channel_cb(channel, tasklet, sending, willblock)
+
+    def install(self):
+        import stackless
+        try:
+            set_schedule_callback = stackless.set_schedule_callback
+            set_channel_callback = stackless.set_channel_callback
+        except AttributeError:
+            return False
+        current = stackless.getcurrent()
+        self._seen[current] = True
+        self._old_schedule_cb = set_schedule_callback(self.schedule_cb)
+        self._old_channel_cb = set_channel_callback(self.channel_cb)
+        self.installed = True
+        return True
+
+    def uninstall(self):
+        if not self.installed:
+            return
+        import stackless
+        stackless.set_schedule_callback(self._old_schedule_cb)
+        stackless.set_channel_callback(self._old_channel_cb)
+        self._old_schedule_cb = self._old_channel_cb = None
+        self.installed = False
+
+    def as_dict(self):
+        return dict((name, getattr(self, name)) for name in COUNTERS)
+
+
+def record(test_id, counter, path=INSTRUMENT_FILE):
+    """Append the counts of *counter* for the test *test_id* to *path*"""
+    r = counter.as_dict()
+    r["id"] = test_id
+    with open(path, "a") as f:
+        f.write(json.dumps(r, sort_keys=True))
+        f.write("\n")
+
+
+def load(path):
+    """Return a dictionary mapping test ids to counts. Later lines win"""
+    result = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                r = json.loads(line)
+                result[r["id"]] = r
+    return result
+
+
+def print_top(counts, stream, top=10):
+    for name in COUNTERS:
+        ranked = sorted(counts.values(), key=lambda r: -r[name])[:top]
+        stream.write("Top %d by %s:\n" % (len(ranked), name))
+        for r in ranked:
+            stream.write("  %10d  %s\n" % (r[name], r["id"]))
+
+
+def print_growth(old, new, stream, top=10):
+    """Print the tests, whose counts grew. Return the number of these tests"""
+    grown = []
+    for test_id in set(old) & set(new):
+        deltas = dict((name, new[test_id][name] - old[test_id][name]) for name in COUNTERS)
+        if any(d > 0 for d in deltas.values()):
+            grown.append((test_id, deltas))
+    grown.sort(key=lambda item: -max(item[1].values()))
+    for test_id, deltas in grown[:top]:
+        stream.write("%s\n    %s\n" % (test_id, ", ".join("%s %+d" % (name, deltas[name])
+                                                          for name in COUNTERS if deltas[name])))
+    stream.write("%d of %d tests have growing counts\n" % (len(grown), len(set(old) & set(new))))
+    return len(grown)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report the scheduler counts of the test cases")
+    parser.add_argument("-n", "--top", type=int, default=10,
+                        help="number of tests to report (default: %(default)s)")
+    parser.add_argument("file", help="counts written by an instrumented test run")
+    parser.add_argument("new_file", nargs="?", default=None,
+                        help="counts of a newer run. Report the tests with growing counts")
+    args = parser.parse_args(argv)
+
+    counts = load(args.file)
+    if args.new_file is None:
+        print_top(counts, sys.stdout, args.top)
+        return 0
+    return 1 if print_growth(counts, load(args.new_file), sys.stdout, args.top) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
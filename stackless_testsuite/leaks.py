@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Memory leak detection for test cases
+
+Set the environment variable STACKLESS_TESTSUITE_LEAKS to the number of
+repetitions (at least 3) to enable the leak detection of StacklessTestCase.
+Each test runs that many times. After every repetition the test case
+collects the garbage and records the memory traced by tracemalloc and the
+number of objects tracked by gc. A test fails, if the traced memory grows in
+every repetition after the first one and by more than
+STACKLESS_TESTSUITE_LEAK_THRESHOLD bytes (default 1024) per repetition.
+The failure message lists the lines, that allocated the retained memory.
+Without tracemalloc, a test fails if the number of objects grows.
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import gc
+import os
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    LEAK_REPEAT = int(os.environ.get("STACKLESS_TESTSUITE_LEAKS") or 0)
+except ValueError:
+    LEAK_REPEAT = 0
+
+try:
+    LEAK_THRESHOLD = int(os.environ.get("STACKLESS_TESTSUITE_LEAK_THRESHOLD") or 1024)
+except ValueError:
+    LEAK_THRESHOLD = 1024
+
+# number of allocating lines in the failure message
+TOP_LINES = 10
+
+
+class Sample(object):
+    def __init__(self):
+        gc.collect()
+        self.objects = len(gc.get_objects())
+        self.snapshot = None
+        self.traced = None
+        if tracemalloc is not None and tracemalloc.is_tracing():
+            self.snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            ))
+            self.traced = sum(stat.size for stat in self.snapshot.statistics("filename"))
+
+
+def slope(values):
+    """The least squares slope of *values* per repetition"""
+    n = len(values)
+    mean_x = (n - 1) / 2.0
+    mean_y = sum(values) / n
+    denominator = sum((x - mean_x) ** 2 for x in range(n))
+    return sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values)) / denominator
+
+
+def growing(values):
+    return all(b > a for a, b in zip(values, values[1:]))
+
+
+class LeakDetector(object):
+    """Run a test repeatedly and check the samples for linear growth"""
+
+    def __init__(self, repeat=LEAK_REPEAT, threshold=LEAK_THRESHOLD):
+        self.repeat = repeat
+        self.threshold = threshold
+        self.samples = []
+        self.started_tracing = False
+
+    def start(self):
+        if tracemalloc is not None and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    def stop(self):
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def sample(self):
+        self.samples.append(Sample())
+
+    def check(self):
+        """Return a description of the leak or None"""
+        # the first repetition fills caches
+        samples = self.samples[1:]
+        if len(samples) < 2:
+            return None
+        objects = [s.objects for s in samples]
+        if samples[0].snapshot is None:
+            # without tracemalloc
+            if not growing(objects):
+                return None
+            return "Leak: gc tracks %+.1f objects per repetition" % (slope(objects),)
+        traced = [s.traced for s in samples]
+        per_repetition = slope(traced)
+        if not growing(traced) or per_repetition <= self.threshold:
+            return None
+        lines = ["Leak: tracemalloc traces %+.0f bytes and gc tracks %+.1f objects per repetition, "
+                 "allocated at" % (per_repetition, slope(objects))]
+        stats = samples[-1].snapshot.compare_to(samples[0].snapshot, "lineno")
+        for stat in [s for s in stats if s.size_diff > 0][:TOP_LINES]:
+            lines.append("  %s" % (stat,))
+        return "\n".join(lines)
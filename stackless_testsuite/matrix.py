@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Run the test suite and benchmarks with several interpreters and switching modes
+
+Every combination of interpreter executable and switching mode (a "cell")
+runs the parallel test runner and optionally benchmark packages in its own
+subprocesses. The tests of the cells run concurrently, the benchmarks run
+one cell after the other to get undisturbed rates. The combined report
+lists per test the outcome in every cell and the duration relative to the
+first cell, and per benchmark variant the rate relative to the first cell.
+
+Usage::
+   $ python -m stackless_testsuite.matrix -i /opt/slp37/bin/python -i /opt/slp38/bin/python \\
+         --bench all --json matrix.json
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+from stackless_testsuite import run
+
+# discovers all benchmarks
+BENCH_ALL = "stackless_testsuite.bench"
+
+MODES = {"soft": "1", "hard": "0"}
+
+OUTCOME_LABELS = {run.SUCCESS: "ok",
+                  run.FAILURE: "FAIL",
+                  run.ERROR: "ERROR",
+                  run.SKIPPED: "skip",
+                  run.EXPECTED_FAILURE: "xfail",
+                  run.UNEXPECTED_SUCCESS: "XPASS",
+                  None: "-",
+                  }
+
+
+class Cell(object):
+    """An interpreter executable and a switching mode"""
+
+    def __init__(self, executable, mode):
+        self.executable = executable
+        self.mode = mode
+        self.tests = {}
+        self.benchmarks = {}
+        self.errors = []
+
+    @property
+    def name(self):
+        return "%s[%s]" % (self.executable, self.mode)
+
+    def environment(self):
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(p for p in (run.TOP_LEVEL_DIR, env.get("PYTHONPATH")) if p)
+        env["STACKLESS_TESTSUITE_SOFTSWITCH"] = MODES[self.mode]
+        return env
+
+    def call(self, args, timeout=None):
+        proc = subprocess.Popen([self.executable] + args, env=self.environment(),
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        timer = None
+        if timeout:
+            timer = threading.Timer(timeout, proc.kill)
+            timer.start()
+        try:
+            output = proc.communicate()[0]
+        finally:
+            if timer is not None:
+                timer.cancel()
+        return proc.returncode, output.decode("utf-8", "replace")
+
+    def run_tests(self, jobs, timeout=None, tests=()):
+        fd, path = tempfile.mkstemp(prefix="stackless_testsuite_matrix_", suffix=".json")
+        os.close(fd)
+        try:
+            args = ["-m", "stackless_testsuite.run", "-q", "-j", str(jobs), "--json", path]
+            if timeout:
+                args += ["--timeout", str(timeout)]
+            returncode, output = self.call(args + list(tests))
+            try:
+                with open(path) as f:
+                    records = json.load(f)["tests"]
+            except ValueError:
+                self.errors.append("test run failed with code %s\n%s" % (returncode, output))
+                return
+            for r in records:
+                self.tests[r["id"]] = r
+        finally:
+            os.unlink(path)
+
+    def run_benchmarks(self, package, scale, pattern=None, timeout=None):
+        fd, path = tempfile.mkstemp(prefix="stackless_testsuite_matrix_", suffix=".jsonl")
+        os.close(fd)
+        try:
+            args = ["-m", package, "-o", path, "--scale", str(scale)]
+            if pattern:
+                args += ["-k", pattern]
+            returncode, output = self.call(args, timeout)
+            if returncode != 0:
+                self.errors.append("%s failed with code %s\n%s" % (package, returncode, output))
+            with open(path) as f:
+                for line in f:
+                    try:
+                        r = json.loads(line)
+                    except ValueError:
+                        break
+                    self.benchmarks[benchmark_key(r)] = r
+        finally:
+            os.unlink(path)
+
+
+def benchmark_key(record):
+    params = record["params"]
+    if record.get("context", "main") != "main":
+        params = dict(params, context=record["context"])
+    return record["benchmark"] + "".join("[%s=%s]" % (k, params[k]) for k in sorted(params))
+
+
+def run_cells(cells, jobs, benchmarks=(), scale=1.0, pattern=None, timeout=None, tests=()):
+    """Run the tests of all cells concurrently, then the benchmarks cell by cell"""
+    threads = [threading.Thread(target=cell.run_tests, args=(jobs, timeout, tests)) for cell in cells]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # concurrent benchmarks would compete for the CPUs
+    for cell in cells:
+        for package in benchmarks:
+            cell.run_benchmarks(package, scale, pattern, timeout)
+
+
+def ratio(value, base):
+    if not value or not base:
+        return None
+    return value / base
+
+
+def format_ratio(r):
+    return "%.2f" % (r,) if r is not None else "-"
+
+
+def test_rows(cells, show_all=False, threshold=0.2):
+    """Return (test id, [(outcome, duration ratio), ...]) for the interesting tests"""
+    ids = set()
+    for cell in cells:
+        ids.update(cell.tests)
+    rows = []
+    for test_id in sorted(ids):
+        records = [cell.tests.get(test_id) for cell in cells]
+        # compare the durations of successful tests only
+        base = records[0]["duration"] if records[0] and records[0]["outcome"] == run.SUCCESS else None
+        row = [(r["outcome"] if r else None,
+                ratio(r["duration"], base) if r and r["outcome"] == run.SUCCESS else None) for r in records]
+        outcomes = set(outcome for outcome, dummy in row)
+        slower = any(d is not None and abs(d - 1.0) > threshold for dummy, d in row[1:])
+        if show_all or len(outcomes) > 1 or (outcomes - set([run.SUCCESS, run.SKIPPED])) or slower:
+            rows.append((test_id, row))
+    return rows
+
+
+def benchmark_rows(cells):
+    """Return (benchmark key, [rate ratio, ...]) relative to the first cell"""
+    keys = set()
+    for cell in cells:
+        keys.update(cell.benchmarks)
+    rows = []
+    for key in sorted(keys):
+        rates = [cell.benchmarks.get(key, {}).get("rate") for cell in cells]
+        rows.append((key, [ratio(rate, rates[0]) for rate in rates]))
+    return rows
+
+
+def print_report(cells, stream, show_all=False, threshold=0.2):
+    for i, cell in enumerate(cells):
+        stream.write("cell %d: %s\n" % (i, cell.name))
+        for error in cell.errors:
+            stream.write("    %s\n" % (error.replace("\n", "\n    "),))
+    headers = " ".join("%-14s" % ("cell %d" % (i,),) for i in range(len(cells)))
+    stream.write("\nTests (outcome, duration relative to cell 0)\n%s  test\n" % (headers,))
+    for test_id, row in test_rows(cells, show_all, threshold):
+        stream.write("%s  %s\n" % (" ".join("%-14s" % ("%s %s" % (OUTCOME_LABELS.get(outcome, outcome),
+                                                                   format_ratio(d)),)
+                                            for outcome, d in row), test_id))
+    rows = benchmark_rows(cells)
+    if rows:
+        stream.write("\nBenchmarks (rate relative to cell 0, larger is faster)\n%s  benchmark\n" % (headers,))
+        for key, ratios in rows:
+            stream.write("%s  %s\n" % (" ".join("%-14s" % (format_ratio(r),) for r in ratios), key))
+    for cell in cells:
+        if cell.errors or any(r["outcome"] in (run.FAILURE, run.ERROR, run.UNEXPECTED_SUCCESS)
+                              for r in cell.tests.values()):
+            return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the suite for several interpreters and switching modes")
+    parser.add_argument("-i", "--interpreter", action="append", default=None, metavar="EXECUTABLE",
+                        help="interpreter executable, may be given several times (default: this interpreter)")
+    parser.add_argument("-m", "--mode", action="append", choices=sorted(MODES), default=None,
+                        help="switching mode, may be given several times (default: both)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="worker processes per cell (default: the number of CPUs divided by the cells)")
+    parser.add_argument("--bench", action="append", default=[], metavar="PACKAGE",
+                        help="also run the benchmark package PACKAGE, 'all' for all packages")
+    parser.add_argument("-s", "--scale", type=float, default=0.1,
+                        help="scale of the benchmark loops (default: %(default)s)")
+    parser.add_argument("-k", "--filter", default=None, metavar="REGEX",
+                        help="run only benchmarks whose name matches REGEX")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="kill a test worker or a benchmark run after TIMEOUT seconds")
+    parser.add_argument("-t", "--threshold", type=float, default=0.2,
+                        help="report test durations, that differ by more than this fraction (default: %(default)s)")
+    parser.add_argument("--all", action="store_true", help="report all tests")
+    parser.add_argument("--json", default=None, metavar="FILE",
+                        help="write the raw results of all cells to FILE")
+    parser.add_argument("tests", nargs="*",
+                        help="names of test modules, classes or methods. Default: discover the tests")
+    args = parser.parse_args(argv)
+
+    interpreters = args.interpreter or [sys.executable]
+    modes = args.mode or ["soft", "hard"]
+    cells = [Cell(executable, mode) for executable in interpreters for mode in modes]
+    jobs = args.jobs or max(1, run.cpu_count() // len(cells))
+    benchmarks = []
+    for package in args.bench:
+        benchmarks.append(BENCH_ALL if package == "all" else package)
+
+    run_cells(cells, jobs, benchmarks, args.scale, args.filter, args.timeout, args.tests)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([{"executable": cell.executable, "mode": cell.mode, "errors": cell.errors,
+                        "tests": cell.tests, "benchmarks": cell.benchmarks} for cell in cells],
+                      f, indent=1, sort_keys=True)
+    return 0 if print_report(cells, sys.stdout, args.all, args.threshold) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
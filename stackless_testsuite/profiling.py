@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Tasklet aware profiling
+
+Ordinary profilers attribute everything to the main tasklet, because they
+don't see tasklet switches. This module provides two profilers, that
+aggregate per tasklet:
+
+- "cprofile" uses one cProfile.Profile per tasklet and switches between
+  them in a schedule callback (stackless.set_schedule_callback). Without
+  the callback a single profile "all" covers all tasklets. The profiles
+  are written as pstats files "NAME.TASKLET.pstats" and summarized in
+  "NAME.cprofile.txt".
+
+- "sample" is a pure Python sampling profiler. A thread periodically takes
+  the frames of all threads from sys._current_frames() and determines the
+  current tasklet of each thread using stackless.get_thread_info(). The
+  samples are written as collapsed stacks "NAME.collapsed", the input
+  format of flamegraph.pl. The root of each stack is the tasklet. The
+  summary "NAME.sample.txt" lists the functions with the most samples per
+  tasklet. Note, that the sampling thread counts as an active thread:
+  tests decorated with util.require_one_thread check the number of threads,
+  when they run, and get skipped.
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import cProfile
+import os
+import pstats
+import re
+import sys
+import threading
+import weakref
+
+import stackless
+
+MODES = ("cprofile", "sample")
+
+# the environment variables used to pass the options to worker processes
+PROFILE_DIR_ENV = "STACKLESS_TESTSUITE_PROFILE"
+PROFILE_MODE_ENV = "STACKLESS_TESTSUITE_PROFILE_MODE"
+
+SAMPLE_INTERVAL = 0.001
+
+# number of functions per tasklet in the summary
+TOP_FUNCTIONS = 15
+
+
+class TaskletLabels(object):
+    """Give tasklets short, stable names: "main", "tasklet-1", ..."""
+
+    def __init__(self):
+        self.labels = weakref.WeakKeyDictionary()
+        self.count = 0
+
+    def __call__(self, tasklet):
+        if tasklet is None:
+            return "unknown"
+        try:
+            return self.labels[tasklet]
+        except KeyError:
+            pass
+        if tasklet.is_main:
+            label = "main"
+        else:
+            self.count += 1
+            label = "tasklet-%d" % (self.count,)
+        self.labels[tasklet] = label
+        return label
+
+
+def safe_name(name):
+    return re.sub(r"[^A-Za-z0-9_.=,-]+", "_", name)[:200]
+
+
+class TaskletCProfiler(object):
+    """One cProfile.Profile per tasklet"""
+
+    def __init__(self):
+        self.label = TaskletLabels()
+        self.profiles = {}
+        self.current = None
+        self.old_callback = None
+        self.with_callback = False
+
+    def profile_for(self, tasklet):
+        label = self.label(tasklet) if self.with_callback else "all"
+        profile = self.profiles.get(label)
+        if profile is None:
+            profile = self.profiles[label] = cProfile.Profile()
+        return profile
+
+    def schedule_cb(self, prev, next):
+        if self.current is not None:
+            self.current.disable()
+            self.current = None
+        if next is not None:
+            self.current = self.profile_for(next)
+            self.current.enable()
+        if self.old_callback is not None:
+            self.old_callback(prev, next)
+
+    def start(self):
+        set_schedule_callback = getattr(stackless, "set_schedule_callback", None)
+        if set_schedule_callback is not None:
+            self.old_callback = set_schedule_callback(self.schedule_cb)
+            self.with_callback = True
+            self.current = self.profile_for(stackless.getcurrent())
+        else:
+            self.current = self.profile_for(None)
+        self.current.enable()
+
+    def stop(self):
+        if self.current is not None:
+            self.current.disable()
+            self.current = None
+        if self.with_callback:
+            stackless.set_schedule_callback(self.old_callback)
+            self.old_callback = None
+            self.with_callback = False
+
+    def write(self, directory, name):
+        with open(os.path.join(directory, name + ".cprofile.txt"), "w") as f:
+            for label in sorted(self.profiles):
+                profile = self.profiles[label]
+                path = os.path.join(directory, "%s.%s.pstats" % (name, label))
+                profile.dump_stats(path)
+                f.write("=== %s ===\n" % (label,))
+                try:
+                    stats = pstats.Stats(profile, stream=f)
+                except TypeError:
+                    # no data
+                    continue
+                stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+
+
+def collapse(frame):
+    """Return the stack of *frame* as list of "function (file:line)", the root first"""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append("%s (%s:%d)" % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class SamplingProfiler(object):
+    """Sample the stacks of the current tasklets of all threads"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.label = TaskletLabels()
+        self.stacks = {}
+        self.samples = 0
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def current_tasklet(self, thread_id):
+        try:
+            return stackless.get_thread_info(thread_id)[1]
+        except Exception:
+            return None
+
+    def take_sample(self):
+        own = threading.current_thread().ident
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            key = tuple([self.label(self.current_tasklet(thread_id))] + collapse(frame))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+        self.samples += 1
+
+    def loop(self):
+        while not self.stopped.wait(self.interval):
+            self.take_sample()
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.loop, name="SamplingProfiler")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def write(self, directory, name):
+        with open(os.path.join(directory, name + ".collapsed"), "w") as f:
+            for key in sorted(self.stacks):
+                f.write("%s %d\n" % (";".join(s.replace(";", ":") for s in key), self.stacks[key]))
+        # self time per tasklet and function
+        per_tasklet = {}
+        for key, count in self.stacks.items():
+            functions = per_tasklet.setdefault(key[0], {})
+            leaf = key[-1] if len(key) > 1 else "<idle>"
+            functions[leaf] = functions.get(leaf, 0) + count
+        with open(os.path.join(directory, name + ".sample.txt"), "w") as f:
+            f.write("%d samples, interval %g s\n" % (self.samples, self.interval))
+            for label in sorted(per_tasklet):
+                functions = per_tasklet[label]
+                f.write("=== %s: %d samples ===\n" % (label, sum(functions.values())))
+                for leaf, count in sorted(functions.items(), key=lambda item: -item[1])[:TOP_FUNCTIONS]:
+                    f.write("%8d  %s\n" % (count, leaf))
+
+
+def make_profiler(mode):
+    if mode == "cprofile":
+        return TaskletCProfiler()
+    if mode == "sample":
+        return SamplingProfiler()
+    raise ValueError("Unknown profile mode %r" % (mode,))
+
+
+class Session(object):
+    """Profile a block of code and write the results on exit
+
+    If *directory* is None, the session does nothing.
+    """
+
+    def __init__(self, directory, name, mode="cprofile"):
+        self.directory = directory
+        self.name = safe_name(name)
+        self.profiler = make_profiler(mode) if directory else None
+
+    def __enter__(self):
+        if self.profiler is not None:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            self.profiler.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler.write(self.directory, self.name)
+        return False
+
+
+def session_from_environment(name):
+    """A session configured by the environment variables of the parallel runner"""
+    return Session(os.environ.get(PROFILE_DIR_ENV) or None, name,
+                   os.environ.get(PROFILE_MODE_ENV) or "cprofile")
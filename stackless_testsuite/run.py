@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Run the test suite in parallel
+
+The runner discovers the tests like "python -m unittest discover" and
+distributes the test modules (or classes) over a pool of worker processes.
+Each job runs in a fresh interpreter, because StacklessTestCase requires a
+clean scheduler and no other threads. The results of all jobs are merged.
+
+Usage::
+   $ python -m stackless_testsuite.run -j 8
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import unittest
+
+import stackless_testsuite
+
+# the directory, that contains the package stackless_testsuite
+TOP_LEVEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(stackless_testsuite.__file__)))
+START_DIR = os.path.dirname(os.path.abspath(stackless_testsuite.__file__))
+
+SUCCESS = "success"
+FAILURE = "failure"
+ERROR = "error"
+SKIPPED = "skipped"
+EXPECTED_FAILURE = "expected_failure"
+UNEXPECTED_SUCCESS = "unexpected_success"
+
+try:
+    from os import cpu_count
+except ImportError:
+    from multiprocessing import cpu_count
+
+
+#
+# Worker side
+#
+class JsonTestResult(unittest.TestResult):
+    """A test result, that records the outcome of every test as a dictionary
+
+    If *stream* is given, the records are also written to *stream* as JSON
+    lines as soon as a test completes. This way the results of a worker
+    survive a crash of the worker process.
+    """
+
+    def __init__(self, stream=None, *args, **kw):
+        super(JsonTestResult, self).__init__(*args, **kw)
+        self.stream = stream
+        self.records = []
+        self._started = None
+
+    def startTest(self, test):
+        super(JsonTestResult, self).startTest(test)
+        self._started = time.time()
+
+    def _record(self, test, outcome, details=None):
+        duration = time.time() - self._started if self._started is not None else 0.0
+        self.add_record({"id": test.id(),
+                         "description": str(test),
+                         "outcome": outcome,
+                         "details": details,
+                         "duration": duration})
+
+    def add_record(self, record):
+        self.records.append(record)
+        if self.stream is not None:
+            self.stream.write(json.dumps(record) + "\n")
+            self.stream.flush()
+
+    def addSuccess(self, test):
+        super(JsonTestResult, self).addSuccess(test)
+        self._record(test, SUCCESS)
+
+    def addFailure(self, test, err):
+        super(JsonTestResult, self).addFailure(test, err)
+        self._record(test, FAILURE, self.failures[-1][1])
+
+    def addError(self, test, err):
+        super(JsonTestResult, self).addError(test, err)
+        self._record(test, ERROR, self.errors[-1][1])
+
+    def addSkip(self, test, reason):
+        super(JsonTestResult, self).addSkip(test, reason)
+        self._record(test, SKIPPED, reason)
+
+    def addExpectedFailure(self, test, err):
+        super(JsonTestResult, self).addExpectedFailure(test, err)
+        self._record(test, EXPECTED_FAILURE)
+
+    def addUnexpectedSuccess(self, test):
+        super(JsonTestResult, self).addUnexpectedSuccess(test)
+        self._record(test, UNEXPECTED_SUCCESS)
+
+    def addSubTest(self, test, subtest, err):
+        super(JsonTestResult, self).addSubTest(test, subtest, err)
+        if err is not None:
+            if issubclass(err[0], test.failureException):
+                self._record(subtest, FAILURE, self.failures[-1][1])
+            else:
+                self._record(subtest, ERROR, self.errors[-1][1])
+
+
+def run_worker(result_file, names):
+    """Run the tests *names* and write the records to *result_file*"""
+    from stackless_testsuite import profiling
+    from stackless_testsuite.util import softswitch_from_environment
+    softswitch_from_environment()
+    loader = unittest.TestLoader()
+    profile = os.environ.get(profiling.PROFILE_DIR_ENV)
+    with open(result_file, "w") as f:
+        result = JsonTestResult(f)
+        for name in names:
+            try:
+                suite = loader.loadTestsFromName(name)
+            except Exception:
+                result.add_record({"id": name,
+                                   "description": name,
+                                   "outcome": ERROR,
+                                   "details": traceback.format_exc(),
+                                   "duration": 0.0})
+                continue
+            if profile:
+                with profiling.session_from_environment(name):
+                    suite.run(result)
+            else:
+                suite.run(result)
+    return 0
+
+
+#
+# Parent side
+#
+def iter_tests(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            for t in iter_tests(test):
+                yield t
+        else:
+            yield test
+
+
+def discover_jobs(start_dir=START_DIR, pattern="test*.py", top_level_dir=TOP_LEVEL_DIR, granularity="module"):
+    """Return a sorted list of test names, one for each job"""
+    suite = unittest.TestLoader().discover(start_dir, pattern, top_level_dir)
+    jobs = set()
+    for test in iter_tests(suite):
+        cls = type(test)
+        if cls.__module__ == "unittest.loader":
+            # a module, that could not be imported. Let the worker report the error
+            jobs.add(test._testMethodName)
+        elif granularity == "class":
+            jobs.add(cls.__module__ + "." + cls.__name__)
+        else:
+            jobs.add(cls.__module__)
+    return sorted(jobs)
+
+
+def worker_command(result_file, name):
+    return [sys.executable, "-m", "stackless_testsuite.run", "--worker", result_file, name]
+
+
+def run_job(name, timeout=None, command=worker_command):
+    """Run a single job in a new interpreter and return the records"""
+    fd, result_file = tempfile.mkstemp(prefix="stackless_testsuite_", suffix=".jsonl")
+    os.close(fd)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (TOP_LEVEL_DIR, env.get("PYTHONPATH")) if p)
+    try:
+        started = time.time()
+        proc = subprocess.Popen(command(result_file, name), env=env,
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        timer = None
+        if timeout:
+            timer = threading.Timer(timeout, proc.kill)
+            timer.start()
+        try:
+            output = proc.communicate()[0]
+        finally:
+            if timer is not None:
+                timer.cancel()
+        records = []
+        with open(result_file) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # incomplete line of a crashed worker
+                    break
+        if proc.returncode != 0:
+            last = "the last completed test was %s" % (records[-1]["id"],) if records else "no test completed"
+            output = output.decode("utf-8", "replace")
+            records.append({"id": name,
+                            "description": name,
+                            "outcome": ERROR,
+                            "details": "Worker process exited with code %s after %.3fs, %s\n%s" % (
+                                proc.returncode, time.time() - started, last, output),
+                            "duration": time.time() - started})
+        return records
+    finally:
+        os.unlink(result_file)
+
+
+def run_jobs(jobs, processes, timeout=None, callback=None):
+    """Run *jobs* with at most *processes* concurrent workers"""
+    pending = list(reversed(jobs))
+    results = []
+    lock = threading.Lock()
+
+    def pool_thread():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                name = pending.pop()
+            records = run_job(name, timeout)
+            with lock:
+                results.extend(records)
+                if callback is not None:
+                    callback(name, records)
+
+    threads = [threading.Thread(target=pool_thread) for i in range(max(1, min(processes, len(jobs))))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sorted(results, key=lambda r: r["id"])
+
+
+class Summary(object):
+    """Print the merged results like unittest.TextTestRunner"""
+
+    separator1 = '=' * 70
+    separator2 = '-' * 70
+    LABELS = {FAILURE: "FAIL", ERROR: "ERROR"}
+
+    def __init__(self, stream, verbosity=1):
+        self.stream = stream
+        self.verbosity = verbosity
+
+    def job_done(self, name, records):
+        if self.verbosity > 1:
+            for r in records:
+                self.stream.write("%s ... %s\n" % (r["description"], r["outcome"]))
+        elif self.verbosity == 1:
+            self.stream.write("." if all(r["outcome"] not in (FAILURE, ERROR) for r in records) else "F")
+        self.stream.flush()
+
+    def print_summary(self, records, elapsed):
+        if self.verbosity == 1:
+            self.stream.write("\n")
+        counts = {}
+        for r in records:
+            counts[r["outcome"]] = counts.get(r["outcome"], 0) + 1
+            if r["outcome"] in self.LABELS:
+                self.stream.write("%s\n%s: %s\n%s\n%s\n" % (self.separator1, self.LABELS[r["outcome"]],
+                                                            r["description"], self.separator2, r["details"]))
+        self.stream.write("%s\nRan %d tests in %.3fs\n\n" % (self.separator2, len(records), elapsed))
+        infos = ["%s=%d" % (k, counts[k]) for k in (FAILURE, ERROR, SKIPPED, EXPECTED_FAILURE, UNEXPECTED_SUCCESS)
+                 if counts.get(k)]
+        ok = not (counts.get(FAILURE) or counts.get(ERROR) or counts.get(UNEXPECTED_SUCCESS))
+        self.stream.write("%s%s\n" % ("OK" if ok else "FAILED", " (%s)" % ", ".join(infos) if infos else ""))
+        return ok
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if "--smoke" in argv:
+        # a light readiness probe, that doesn't import the test machinery
+        from stackless_testsuite import smoke
+        return smoke.main(["--quiet"] if "-q" in argv or "--quiet" in argv else [])
+    from stackless_testsuite import profiling, store
+
+    parser = argparse.ArgumentParser(description="Run the stackless test suite in parallel worker processes")
+    parser.add_argument("-j", "--jobs", type=int, default=cpu_count(),
+                        help="number of worker processes (default: %(default)s)")
+    parser.add_argument("-v", "--verbose", dest="verbosity", action="store_const", const=2, default=1,
+                        help="print the result of every test")
+    parser.add_argument("-q", "--quiet", dest="verbosity", action="store_const", const=0,
+                        help="print the summary only")
+    parser.add_argument("-s", "--start-directory", default=START_DIR,
+                        help="directory to start discovery (default: the package stackless_testsuite)")
+    parser.add_argument("-p", "--pattern", default="test*.py",
+                        help="pattern to match test files (default: %(default)s)")
+    parser.add_argument("--granularity", choices=("module", "class"), default="module",
+                        help="distribute test modules or test classes (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="kill a worker after TIMEOUT seconds")
+    parser.add_argument("--json", default=None, metavar="FILE",
+                        help="write the merged results to FILE")
+    parser.add_argument("--store", default=None, metavar="FILE",
+                        help="append the durations of the successful tests to the result store FILE")
+    parser.add_argument("--profile", default=None, metavar="DIR",
+                        help="profile every job and write the profiles to DIR, see stackless_testsuite.profiling")
+    parser.add_argument("--profile-mode", choices=profiling.MODES, default="cprofile",
+                        help="per tasklet cProfile or pure Python sampling profiler (default: %(default)s)")
+    parser.add_argument("--smoke", action="store_true",
+                        help="run the smoke test only, see stackless_testsuite.smoke")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("tests", nargs="*",
+                        help="names of test modules, classes or methods. Default: discover the tests")
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        return run_worker(args.worker, args.tests)
+    if args.profile:
+        # the workers inherit the environment
+        os.environ[profiling.PROFILE_DIR_ENV] = os.path.abspath(args.profile)
+        os.environ[profiling.PROFILE_MODE_ENV] = args.profile_mode
+    started = time.time()
+    jobs = args.tests or discover_jobs(args.start_directory, args.pattern, granularity=args.granularity)
+    summary = Summary(sys.stderr, args.verbosity)
+    records = run_jobs(jobs, args.jobs, args.timeout, summary.job_done)
+    elapsed = time.time() - started
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"elapsed": elapsed, "jobs": len(jobs), "processes": args.jobs, "tests": records},
+                      f, indent=1, sort_keys=True)
+    if args.store:
+        from stackless_testsuite.util import softswitch_from_environment
+        # the records carry the switching mode of the workers
+        softswitch_from_environment()
+        run_id = store.new_run_id()
+        env = store.environment()
+        store.append(args.store, [store.from_test(r, run_id, env) for r in records])
+    return 0 if summary.print_summary(records, elapsed) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
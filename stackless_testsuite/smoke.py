@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Smoke test
+
+A minimal health check of a Stackless interpreter: the module content, a
+channel ping-pong and the basic tasklet life cycle. It imports neither
+unittest nor the test modules and finishes within a few milliseconds, i.e.
+as a readiness probe of a container.
+
+Usage::
+   $ python -m stackless_testsuite.smoke [-q]
+
+The exit code is 0, if all checks pass.
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import sys
+import time
+
+# a subset of v3_1.test_content.DECLARED_API and ADDITIONAL_API
+MODULE_NAMES = ("tasklet", "channel", "atomic", "run", "schedule", "schedule_remove",
+                "getcurrent", "getmain", "getruncount", "current", "main", "runcount")
+
+PING_PONG_MESSAGES = 100
+
+
+class SmokeFailure(Exception):
+    pass
+
+
+def check(condition, message):
+    if not condition:
+        raise SmokeFailure(message)
+
+
+def check_module_content(stackless):
+    missing = [name for name in MODULE_NAMES if not hasattr(stackless, name)]
+    check(not missing, "stackless lacks %s" % (", ".join(missing),))
+    check(stackless.getcurrent() is stackless.getmain(), "the smoke test must run on the main tasklet")
+    check(stackless.getruncount() == 1, "the run queue is not empty")
+
+
+def check_channel_ping_pong(stackless):
+    ping = stackless.channel()
+    pong = stackless.channel()
+
+    def echo():
+        for i in range(PING_PONG_MESSAGES):  # @UnusedVariable
+            pong.send(ping.receive())
+
+    stackless.tasklet(echo)()
+    for i in range(PING_PONG_MESSAGES):
+        ping.send(i)
+        check(pong.receive() == i, "channel ping-pong returned a wrong message")
+    check(ping.balance == 0 and pong.balance == 0, "channel balance is not 0")
+    stackless.run()
+    check(stackless.getruncount() == 1, "ping-pong leaked a tasklet")
+
+
+def check_tasklet_life_cycle(stackless):
+    result = []
+
+    def func(x):
+        result.append(x)
+
+    t = stackless.tasklet()
+    check(not t.alive and not t.scheduled, "new tasklet is alive")
+    t.bind(func)
+    check(not t.alive, "bound tasklet is alive")
+    t.setup(1)
+    check(t.alive and t.scheduled, "setup did not schedule the tasklet")
+    t.remove()
+    check(t.paused and not t.scheduled, "remove did not pause the tasklet")
+    t.insert()
+    check(t.scheduled, "insert did not schedule the tasklet")
+    t.run()
+    check(not t.alive and result == [1], "run did not execute the tasklet")
+
+    t = stackless.tasklet(func)(2)
+    t.kill()
+    check(not t.alive and result == [1], "kill did not end the tasklet")
+    check(stackless.getruncount() == 1, "life cycle leaked a tasklet")
+
+
+CHECKS = (check_module_content, check_channel_ping_pong, check_tasklet_life_cycle)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    quiet = "-q" in argv or "--quiet" in argv
+    t0 = time.time()
+    try:
+        import stackless
+        for func in CHECKS:
+            func(stackless)
+    except Exception as e:
+        print("FAILED: %s: %s" % (type(e).__name__, e), file=sys.stderr)
+        return 1
+    if not quiet:
+        print("OK (%d checks in %.1f ms)" % (len(CHECKS), (time.time() - t0) * 1e3))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Result store
+
+An append-only JSON lines file, that collects test durations and benchmark
+timings of many runs. Each line is a single measurement::
+
+   {"run": ..., "kind": "test" or "benchmark", "name": ..., "params": ...,
+    "samples": [seconds, ...], "env": {...}}
+
+The samples of benchmarks with the measure "slices" are watchdog slices
+per operation. They hardly vary, so "compare" flags every increase above
+the threshold. Use them to gate changes of the scheduler paths.
+
+The environment records the interpreter version, the soft switching state
+and the git revision. Set the environment variable
+STACKLESS_TESTSUITE_REVISION to override the revision, i.e. if you test an
+interpreter build from a different repository.
+
+Usage::
+   $ python -m stackless_testsuite.store list
+   $ python -m stackless_testsuite.store compare BASE NEW
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+
+DEFAULT_STORE = os.environ.get("STACKLESS_TESTSUITE_STORE") or "stackless_testsuite_results.jsonl"
+
+# the directory, that contains the package stackless_testsuite
+TOP_LEVEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git_revision(directory=TOP_LEVEL_DIR):
+    """Return the git revision of *directory* or None"""
+    revision = os.environ.get("STACKLESS_TESTSUITE_REVISION")
+    if revision:
+        return revision
+    try:
+        with open(os.devnull, "w") as devnull:
+            output = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                             cwd=directory, stderr=devnull)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode("ascii", "replace").strip() or None
+
+
+def softswitch_enabled():
+    """Return the soft switching state of this interpreter or None"""
+    try:
+        import stackless
+        return bool(stackless.enable_softswitch(None))
+    except (ImportError, AttributeError):
+        return None
+
+
+def environment():
+    """Describe the interpreter, that executes the tests and benchmarks"""
+    return {"python": platform.python_version(),
+            "version": sys.version,
+            "implementation": platform.python_implementation(),
+            "executable": sys.executable,
+            "platform": platform.platform(),
+            "softswitch": softswitch_enabled(),
+            "revision": git_revision(),
+            }
+
+
+def new_run_id():
+    return "%s-%d" % (time.strftime("%Y%m%dT%H%M%S"), os.getpid())
+
+
+#
+# Conversion of results into store records
+#
+def from_test(record, run_id, env):
+    """Convert a record of run.JsonTestResult. Return None for unsuccessful tests"""
+    if record["outcome"] != "success":
+        return None
+    return {"run": run_id, "kind": "test", "name": record["id"], "params": None,
+            "samples": [record["duration"]], "env": env}
+
+
+def from_benchmark(record, run_id, env):
+    """Convert a benchmark result record. Return None for skipped benchmarks"""
+    if "skipped" in record:
+        return None
+    ops = record["ops"]
+    params = record["params"]
+    if record.get("context", "main") != "main":
+        params = dict(params, context=record["context"])
+    return {"run": run_id, "kind": "benchmark", "name": record["benchmark"], "params": params,
+            "unit": record["unit"], "measure": record.get("measure", "time"),
+            "samples": [t / ops for t in record["times"]], "env": env}
+
+
+def append(path, records):
+    """Append *records* to the store *path*"""
+    with open(path, "a") as f:
+        for record in records:
+            if record is not None:
+                f.write(json.dumps(record, sort_keys=True))
+                f.write("\n")
+
+
+def load(path):
+    records = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+def runs(records):
+    """Return a list of (run_id, env, number of records) in store order"""
+    result = []
+    index = {}
+    for r in records:
+        if r["run"] not in index:
+            index[r["run"]] = len(result)
+            result.append([r["run"], r["env"], 0])
+        result[index[r["run"]]][2] += 1
+    return [tuple(r) for r in result]
+
+
+def select(records, selector):
+    """Return the records of the runs matching *selector*
+
+    *selector* is a run id, a git revision or "latest"/"previous" for the
+    last two runs in the store. Records of all matching runs get merged.
+    """
+    all_runs = [r[0] for r in runs(records)]
+    if selector in ("latest", "previous"):
+        offset = 1 if selector == "latest" else 2
+        if len(all_runs) < offset:
+            raise ValueError("The store contains less than %d runs" % (offset,))
+        selected = set([all_runs[-offset]])
+    else:
+        selected = set(r["run"] for r in records
+                       if r["run"] == selector or r["env"].get("revision") == selector)
+    if not selected:
+        raise ValueError("No run matches %r" % (selector,))
+    return [r for r in records if r["run"] in selected]
+
+
+def key(record):
+    return (record["kind"], record["name"], json.dumps(record["params"], sort_keys=True))
+
+
+def samples_by_key(records):
+    result = {}
+    for r in records:
+        result.setdefault(key(r), []).extend(r["samples"])
+    return result
+
+
+#
+# Statistics
+#
+def mean_var(samples):
+    n = len(samples)
+    mean = sum(samples) / n
+    var = sum((x - mean) ** 2 for x in samples) / (n - 1) if n > 1 else 0.0
+    return mean, var
+
+
+def _betacf(a, b, x):
+    # continued fraction for the incomplete beta function (Numerical Recipes)
+    tiny = 1e-30
+    qab = a + b
+    qap = a + 1.0
+    qam = a - 1.0
+    c = 1.0
+    d = 1.0 - qab * x / qap
+    if abs(d) < tiny:
+        d = tiny
+    d = 1.0 / d
+    h = d
+    for m in range(1, 201):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1.0 + aa * d
+        if abs(d) < tiny:
+            d = tiny
+        c = 1.0 + aa / c
+        if abs(c) < tiny:
+            c = tiny
+        d = 1.0 / d
+        h *= d * c
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1.0 + aa * d
+        if abs(d) < tiny:
+            d = tiny
+        c = 1.0 + aa / c
+        if abs(c) < tiny:
+            c = tiny
+        d = 1.0 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1.0) < 3e-12:
+            break
+    return h
+
+
+def betai(a, b, x):
+    """The regularized incomplete beta function I_x(a, b)"""
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    bt = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) +
+                  a * math.log(x) + b * math.log(1.0 - x))
+    if x < (a + 1.0) / (a + b + 2.0):
+        return bt * _betacf(a, b, x) / a
+    return 1.0 - bt * _betacf(b, a, 1.0 - x) / b
+
+
+def t_quantile(confidence, df):
+    """Return t, such that P(-t < T < t) = *confidence* for Student's t with *df* degrees of freedom"""
+    lo, hi = 0.0, 1.0
+    # the two-sided tail probability is betai(df/2, 1/2, df/(df+t*t))
+    while betai(df / 2.0, 0.5, df / (df + hi * hi)) > 1.0 - confidence:
+        hi *= 2.0
+    for i in range(100):  # @UnusedVariable
+        mid = (lo + hi) / 2.0
+        if betai(df / 2.0, 0.5, df / (df + mid * mid)) > 1.0 - confidence:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2.0
+
+
+def welch_test(base, new):
+    """Welch's t-test. Return the one-sided p-value for "new is slower than base"
+
+    Return None, if there are not enough samples.
+    """
+    if len(base) < 2 or len(new) < 2:
+        return None
+    m1, v1 = mean_var(base)
+    m2, v2 = mean_var(new)
+    se1 = v1 / len(base)
+    se2 = v2 / len(new)
+    if se1 + se2 == 0.0:
+        return 0.0 if m2 > m1 else 1.0
+    t = (m2 - m1) / math.sqrt(se1 + se2)
+    df = (se1 + se2) ** 2 / (se1 ** 2 / (len(base) - 1) + se2 ** 2 / (len(new) - 1))
+    # two-sided tail probability of Student's t distribution
+    p2 = betai(df / 2.0, 0.5, df / (df + t * t))
+    return p2 / 2.0 if t > 0 else 1.0 - p2 / 2.0
+
+
+def compare(base_records, new_records, threshold=0.05, alpha=0.01):
+    """Compare two sets of records
+
+    Return a list of dictionaries, one for each key present in both sets,
+    ordered by descending slowdown. A result is flagged as a regression, if
+    the mean grew by more than *threshold* and the p-value of Welch's t-test
+    is below *alpha*. Without enough samples for the test, only the
+    threshold applies and the result is marked as not significant.
+    """
+    base = samples_by_key(base_records)
+    new = samples_by_key(new_records)
+    results = []
+    for k in set(base) & set(new):
+        b_mean = mean_var(base[k])[0]
+        n_mean = mean_var(new[k])[0]
+        ratio = n_mean / b_mean if b_mean > 0 else None
+        p = welch_test(base[k], new[k])
+        slower = ratio is not None and ratio > 1.0 + threshold
+        results.append({"kind": k[0], "name": k[1], "params": json.loads(k[2]),
+                        "base": b_mean, "new": n_mean, "ratio": ratio, "p": p,
+                        "regression": slower and p is not None and p < alpha,
+                        "suspect": slower and p is None,
+                        })
+    results.sort(key=lambda r: -(r["ratio"] or 0.0))
+    return results
+
+
+#
+# Command line interface
+#
+def format_params(params):
+    if not params:
+        return ""
+    return "[%s]" % (",".join("%s=%s" % (k, params[k]) for k in sorted(params)),)
+
+
+def print_runs(records, stream):
+    for run_id, env, count in runs(records):
+        stream.write("%-24s %-10s python=%-8s softswitch=%-5s %5d records\n" % (
+            run_id, env.get("revision"), env.get("python"), env.get("softswitch"), count))
+
+
+def print_comparison(results, stream, show_all=False):
+    regressions = 0
+    for r in results:
+        if r["regression"]:
+            flag = "SLOWER"
+            regressions += 1
+        elif r["suspect"]:
+            flag = "slower?"
+        elif not show_all:
+            continue
+        else:
+            flag = ""
+        ratio = "%7.3f" % (r["ratio"],) if r["ratio"] is not None else "    n/a"
+        p = "%.4f" % (r["p"],) if r["p"] is not None else "n/a"
+        stream.write("%-7s %s p=%-6s %-9s %s%s\n" % (flag, ratio, p, r["kind"], r["name"],
+                                                     format_params(r["params"])))
+    stream.write("%d of %d compared results are significantly slower\n" % (regressions, len(results)))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the result store of tests and benchmarks")
+    parser.add_argument("--store", default=DEFAULT_STORE,
+                        help="the result store (default: %(default)s)")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("list", help="list the runs in the store")
+    p = subparsers.add_parser("compare", help="flag significant slowdowns between two runs")
+    p.add_argument("base", help="run id, git revision or 'previous'")
+    p.add_argument("new", nargs="?", default="latest", help="run id, git revision or 'latest' (default)")
+    p.add_argument("-t", "--threshold", type=float, default=0.05,
+                   help="minimal relative slowdown (default: %(default)s)")
+    p.add_argument("-a", "--alpha", type=float, default=0.01,
+                   help="significance level of the t-test (default: %(default)s)")
+    p.add_argument("--all", action="store_true", help="print all compared results")
+    args = parser.parse_args(argv)
+
+    records = load(args.store)
+    if args.command == "compare":
+        try:
+            base = select(records, args.base)
+            new = select(records, args.new)
+        except ValueError as e:
+            parser.error(str(e))
+        results = compare(base, new, args.threshold, args.alpha)
+        return 1 if print_comparison(results, sys.stdout, args.all) else 0
+    print_runs(records, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
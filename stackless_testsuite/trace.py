@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Record and replay of scheduler event traces
+
+Set the environment variable STACKLESS_TESTSUITE_TRACE to the name of a
+file to record a trace of every StacklessTestCase, or pass ``--trace FILE``
+to a benchmark command. A trace is a JSON line::
+
+   {"id": ..., "seed": ..., "softswitch": ..., "hashseed": ..., "events": [...]}
+
+The events are compact strings. Tasklets and channels are numbered in the
+order of their first appearance, the main tasklet is 0:
+
+- "s1>2": a switch from tasklet 1 to tasklet 2 ("-" for None)
+- "c0s1!": tasklet 1 sends on channel 0 ("r" receives), "!" if it blocks
+- "w2": stackless.run() returned tasklet 2, interrupted by the watchdog
+
+Repeated events are stored as [event, count]. The events come from
+stackless.set_schedule_callback, stackless.set_channel_callback and a
+wrapper of stackless.run. Without the callbacks only the watchdog events
+get recorded.
+
+The schedule of Stackless depends on its inputs only: the code, the
+random numbers (i.e. test_watchdog.test_channelchain uses random.randint),
+the switching mode and the hash seed. The watchdog counts instructions, so
+it interrupts at the same points, if the inputs are the same. A recording
+session seeds the module random and stores the seed, the switching mode
+and PYTHONHASHSEED. Set STACKLESS_TESTSUITE_TRACE_REPLAY to the trace file
+(or pass ``--replay FILE`` to a benchmark command) to restore these
+inputs and to compare the events with the recorded trace. A test fails at
+the end, if its schedule diverged from the trace. To replay a single test
+in a new process with the recorded hash seed use::
+
+   $ python -m stackless_testsuite.trace replay FILE TEST_ID
+   $ python -m stackless_testsuite.trace show FILE [TEST_ID]
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import weakref
+
+TRACE_FILE = os.environ.get("STACKLESS_TESTSUITE_TRACE") or None
+REPLAY_FILE = os.environ.get("STACKLESS_TESTSUITE_TRACE_REPLAY") or None
+
+# number of events around a divergence in the failure message
+CONTEXT = 5
+
+
+class Labels(object):
+    """Number objects in the order of their first appearance"""
+
+    def __init__(self):
+        self.weak = weakref.WeakKeyDictionary()
+        self.strong = {}
+        self.count = 0
+
+    def __call__(self, obj):
+        if obj is None:
+            return "-"
+        try:
+            return self.weak[obj]
+        except TypeError:
+            # not weak referenceable
+            try:
+                return self.strong[id(obj)][0]
+            except KeyError:
+                pass
+        except KeyError:
+            pass
+        label = str(self.count)
+        self.count += 1
+        try:
+            self.weak[obj] = label
+        except TypeError:
+            # keep the object to keep its id unique
+            self.strong[id(obj)] = (label, obj)
+        return label
+
+
+def compress(events):
+    """Run length encoding of a list of events"""
+    result = []
+    for event in events:
+        if result and (result[-1] == event or (isinstance(result[-1], list) and result[-1][0] == event)):
+            if isinstance(result[-1], list):
+                result[-1][1] += 1
+            else:
+                result[-1] = [event, 2]
+        else:
+            result.append(event)
+    return result
+
+
+def expand(events):
+    result = []
+    for event in events:
+        if isinstance(event, list):
+            result.extend([event[0]] * event[1])
+        else:
+            result.append(event)
+    return result
+
+
+class Recorder(object):
+    """Record the scheduler events"""
+
+    def __init__(self):
+        self.events = []
+        self.tasklets = Labels()
+        self.channels = Labels()
+        self._old_schedule_cb = self._old_channel_cb = None
+        self._run = None
+        self.installed = False
+
+    def event(self, event):
+        self.events.append(event)
+
+    def schedule_cb(self, prev, next):
+        self.event("s%s>%s" % (self.tasklets(prev), self.tasklets(next)))
+        if self._old_schedule_cb is not None:
+            self._old_schedule_cb(prev, next)
+
+    def channel_cb(self, channel, tasklet, sending, willblock):
+        self.event("c%s%s%s%s" % (self.channels(channel), "s" if sending else "r", self.tasklets(tasklet),
+                                  "!" if willblock else ""))
+        if self._old_channel_cb is not None:
+            self._old_channel_cb(channel, tasklet, sending, willblock)
+
+    def install(self):
+        import stackless
+        self.tasklets(stackless.getmain())
+        run = self._run = stackless.run
+
+        def traced_run(*args, **kwargs):
+            interrupted = run(*args, **kwargs)
+            if interrupted is not None:
+                self.event("w%s" % (self.tasklets(interrupted),))
+            return interrupted
+        stackless.run = traced_run
+        try:
+            self._old_schedule_cb = stackless.set_schedule_callback(self.schedule_cb)
+            self._old_channel_cb = stackless.set_channel_callback(self.channel_cb)
+        except AttributeError:
+            # record the watchdog events only
+            pass
+        self.installed = True
+
+    def uninstall(self):
+        if not self.installed:
+            return
+        import stackless
+        stackless.run = self._run
+        try:
+            stackless.set_schedule_callback(self._old_schedule_cb)
+            stackless.set_channel_callback(self._old_channel_cb)
+        except AttributeError:
+            pass
+        self._old_schedule_cb = self._old_channel_cb = self._run = None
+        self.installed = False
+
+
+class Replayer(Recorder):
+    """Compare the scheduler events with a recorded trace"""
+
+    def __init__(self, expected):
+        super(Replayer, self).__init__()
+        self.expected = expand(expected)
+        self.divergence = None
+
+    def event(self, event):
+        index = len(self.events)
+        self.events.append(event)
+        if self.divergence is None:
+            expected = self.expected[index] if index < len(self.expected) else None
+            if event != expected:
+                self.divergence = index
+
+    def check(self):
+        """Return None or a description of the divergence"""
+        index = self.divergence
+        if index is None:
+            if len(self.events) == len(self.expected):
+                return None
+            index = len(self.events)
+        start = max(0, index - CONTEXT)
+        return ("the schedule diverged from the trace at event %d:\n    recorded: %s\n    replayed: %s" %
+                (index, " ".join(self.expected[start:index + CONTEXT]), " ".join(self.events[start:index + CONTEXT])))
+
+
+def softswitch_enabled():
+    import stackless
+    try:
+        return bool(stackless.enable_softswitch(None))
+    except AttributeError:
+        return None
+
+
+def load(path):
+    """Return a dictionary mapping ids to traces. Later lines win"""
+    result = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                r = json.loads(line)
+                result[r["id"]] = r
+    return result
+
+
+def append(path, trace):
+    """Append *trace* to the file *path*
+
+    A single write to a descriptor opened with O_APPEND keeps the lines of
+    parallel workers (stackless_testsuite.run -j) apart.
+    """
+    data = (json.dumps(trace, sort_keys=True) + "\n").encode("utf-8")
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+    try:
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+
+
+_loaded = {}
+
+
+def load_cached(path):
+    try:
+        return _loaded[path]
+    except KeyError:
+        pass
+    traces = _loaded[path] = load(path) if os.path.exists(path) else {}
+    return traces
+
+
+class Session(object):
+    """Record or replay the trace of a block of code
+
+    *mode* is "record" or "replay". If *path* is None or, when replaying,
+    the file has no trace named *name*, the session does nothing.
+    """
+
+    def __init__(self, path, name, mode="record"):
+        self.path = path
+        self.name = name
+        self.mode = mode
+        self.tracer = None
+        self.trace = None
+        self._softswitch = None
+
+    def __enter__(self):
+        if self.path is None:
+            return self
+        if self.mode == "replay":
+            self.trace = load_cached(self.path).get(self.name)
+            if self.trace is None:
+                return self
+            self.tracer = Replayer(self.trace["events"])
+            if self.trace["softswitch"] is not None:
+                import stackless
+                self._softswitch = stackless.enable_softswitch(self.trace["softswitch"])
+        else:
+            self.trace = {"id": self.name,
+                          "seed": random.SystemRandom().randint(0, 2 ** 31),
+                          "softswitch": softswitch_enabled(),
+                          "hashseed": os.environ.get("PYTHONHASHSEED"),
+                          }
+            self.tracer = Recorder()
+        random.seed(self.trace["seed"])
+        self.tracer.install()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self.tracer is None:
+            return False
+        self.tracer.uninstall()
+        if self._softswitch is not None:
+            import stackless
+            stackless.enable_softswitch(self._softswitch)
+            self._softswitch = None
+        if self.mode == "record":
+            self.trace["events"] = compress(self.tracer.events)
+            append(self.path, self.trace)
+        return False
+
+    def divergence(self):
+        """Return None or a description, how the replayed schedule diverged"""
+        if self.mode != "replay" or self.tracer is None:
+            return None
+        return self.tracer.check()
+
+    def check(self):
+        """Raise AssertionError, if the replayed schedule diverged"""
+        message = self.divergence()
+        if message is not None:
+            raise AssertionError(message)
+
+
+def session_from_environment(name):
+    """A session configured by STACKLESS_TESTSUITE_TRACE_REPLAY or STACKLESS_TESTSUITE_TRACE"""
+    if REPLAY_FILE:
+        return Session(REPLAY_FILE, name, "replay")
+    return Session(TRACE_FILE, name, "record")
+
+
+#
+# Command line interface
+#
+def show(traces, stream, name=None):
+    for trace_id in sorted(traces):
+        if name is not None and trace_id != name:
+            continue
+        trace = traces[trace_id]
+        events = trace["events"]
+        stream.write("%s: seed=%s softswitch=%s hashseed=%s, %d events\n" % (
+            trace_id, trace["seed"], trace["softswitch"], trace["hashseed"], len(expand(events))))
+        if name is not None:
+            for event in events:
+                if isinstance(event, list):
+                    stream.write("    %s x%d\n" % tuple(event))
+                else:
+                    stream.write("    %s\n" % (event,))
+
+
+def replay(path, name):
+    """Replay the test *name* in a new process"""
+    trace = load(path).get(name)
+    if trace is None:
+        print("No trace for %s in %s" % (name, path))
+        return 2
+    env = dict(os.environ)
+    env["STACKLESS_TESTSUITE_TRACE_REPLAY"] = os.path.abspath(path)
+    env.pop("STACKLESS_TESTSUITE_TRACE", None)
+    if trace["hashseed"] is not None:
+        env["PYTHONHASHSEED"] = trace["hashseed"]
+    else:
+        print("The trace was recorded with a random hash seed. Record with PYTHONHASHSEED=0 "
+              "for reproducible replays.")
+    return subprocess.call([sys.executable, "-m", "unittest", "-v", name], env=env)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and replay scheduler event traces")
+    subparsers = parser.add_subparsers(dest="command")
+    p = subparsers.add_parser("show", help="list the traces or print the events of a trace")
+    p.add_argument("file", help="the trace file")
+    p.add_argument("id", nargs="?", default=None, help="the test id or benchmark variant")
+    p = subparsers.add_parser("replay", help="replay a test in a new process")
+    p.add_argument("file", help="the trace file")
+    p.add_argument("id", help="the test id")
+    args = parser.parse_args(argv)
+
+    if args.command == "replay":
+        return replay(args.file, args.id)
+    if args.command == "show":
+        show(load(args.file), sys.stdout, args.id)
+        return 0
+    parser.print_help()
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
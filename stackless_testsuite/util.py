@@ -22,12 +22,19 @@ Utility functions and classes
 
 from __future__ import absolute_import, print_function, division
 
+import atexit
+import functools
+import hashlib
 import types
 import inspect
+import json
+import os
 import sys
+import tempfile
 import unittest
 import re
 import stackless
+from stackless_testsuite import instrument, leaks, trace
 
 FUNCTION = object()
 ROUTINE = object()
@@ -39,10 +46,124 @@ except NameError:
     long = int  # @ReservedAssignment
 
 
-def _testAttributeTypeTemplate(self, getContainer=None, name=None, expected_type=None):
+# Set the environment variable STACKLESS_TESTSUITE_CACHE to a directory to
+# cache the results of the attribute type tests. A test passes without
+# further checks, if it passed before with an identical API fingerprint.
+API_CACHE_DIR = os.environ.get("STACKLESS_TESTSUITE_CACHE") or None
+
+_EXPECTED_TYPE_NAMES = {id(FUNCTION): "FUNCTION", id(ROUTINE): "ROUTINE", id(callable): "callable"}
+
+
+def _describe(value):
+    signature = None
+    if callable(value) and hasattr(inspect, "signature"):
+        try:
+            signature = str(inspect.signature(value))
+        except (TypeError, ValueError):
+            pass
+    t = type(value)
+    return [t.__module__, getattr(t, "__qualname__", t.__name__), callable(value),
+            inspect.isfunction(value), inspect.isbuiltin(value), inspect.isroutine(value), signature]
+
+
+def api_fingerprint(container, names):
+    """Describe the type and signature of the attributes *names* of *container*"""
+    fingerprint = {}
+    for name in names:
+        try:
+            value = getattr(container, name)
+        except AttributeError:
+            fingerprint[name] = None
+        else:
+            fingerprint[name] = _describe(value)
+    return fingerprint
+
+
+try:
+    _replace = os.replace
+except AttributeError:
+    # Python 2
+    _replace = os.rename
+
+
+class ApiCache(object):
+    """The keys of passed attribute type tests, stored in a JSON file"""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, "api_cache.json")
+        self.digests = {}
+        self.passed = None
+        self.dirty = False
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return set(json.load(f))
+        except (IOError, OSError, ValueError):
+            return set()
+
+    def load(self):
+        self.passed = self._read()
+
+    def save(self):
+        if not self.dirty:
+            return
+        # parallel workers share the file: merge the keys saved by other
+        # processes and replace the file atomically
+        directory = os.path.dirname(self.path)
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            passed = self._read() | self.passed
+            fd, tmp = tempfile.mkstemp(prefix="api_cache.", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(sorted(passed), f, indent=0)
+                _replace(tmp, self.path)
+            except:
+                os.unlink(tmp)
+                raise
+        except (IOError, OSError):
+            pass
+        self.dirty = False
+
+    def key(self, testcase, getContainer, container, api, name, expected_type):
+        # compute the fingerprint once per test class and container
+        memo_key = (type(testcase), getContainer)
+        digest = self.digests.get(memo_key)
+        if digest is None:
+            data = json.dumps([sys.version, sys.executable, api_fingerprint(container, api)], sort_keys=True)
+            digest = self.digests[memo_key] = hashlib.sha1(data.encode("utf-8")).hexdigest()
+        expected = _EXPECTED_TYPE_NAMES.get(id(expected_type)) or repr(expected_type)
+        return "%s %s.%s.%s %s" % (digest, type(testcase).__module__, type(testcase).__name__, name, expected)
+
+    def __contains__(self, key):
+        if self.passed is None:
+            self.load()
+        return key in self.passed
+
+    def add(self, key):
+        if self.passed is None:
+            self.load()
+        self.passed.add(key)
+        self.dirty = True
+
+if API_CACHE_DIR:
+    api_cache = ApiCache(API_CACHE_DIR)
+    atexit.register(api_cache.save)
+else:
+    api_cache = None
+
+
+def _testAttributeTypeTemplate(self, getContainer=None, name=None, expected_type=None, api=()):
     container = None
     try:
         container = getContainer(self)
+        key = None
+        if api_cache is not None:
+            key = api_cache.key(self, getContainer, container, api, name, expected_type)
+            if key in api_cache:
+                return
         value = getattr(container, name)
     except AttributeError:
         self.fail("'{}' has no member '{}'".format(container, name))
@@ -54,11 +175,14 @@ def _testAttributeTypeTemplate(self, getContainer=None, name=None, expected_type
         self.assertTrue(inspect.isroutine(value))
     else:
         self.assertIsInstance(value, expected_type)
+    if key is not None:
+        api_cache.add(key)
 
 
 def create_type_tests_for_module(ns, module, api_declared, api_additional):
     api = dict(api_declared)
     api.update(api_additional)
+    names = tuple(sorted(api))
     template = _testAttributeTypeTemplate
 
     def getContainer(self):
@@ -72,10 +196,11 @@ def create_type_tests_for_module(ns, module, api_declared, api_additional):
         ns[test_name] = types.FunctionType(template.__code__,
                                            template.__globals__,
                                            test_name,
-                                           (getContainer, name, expected_type))
+                                           (getContainer, name, expected_type, names))
 
 
 def create_type_tests_for_class(ns, api):
+    names = tuple(sorted(api))
     template = _testAttributeTypeTemplate
     for index, prefix, getContainer in ((0, 'testAttributeTypeOnClass_', lambda self: self.the_class),
                                         (1, 'testAttributeTypeOnInstance_', lambda self: self.the_instance)):
@@ -89,7 +214,7 @@ def create_type_tests_for_class(ns, api):
             ns[test_name] = types.FunctionType(template.__code__,
                                                template.__globals__,
                                                test_name,
-                                               (getContainer, name, expected_type))
+                                               (getContainer, name, expected_type, names))
 
 
 try:
@@ -99,10 +224,54 @@ except:
     withThreads = False
 
 
+# Set the environment variable STACKLESS_TESTSUITE_SOFTSWITCH to 0 or 1 to
+# disable or enable soft switching in the workers of stackless_testsuite.run
+# and in benchmark commands.
+SOFTSWITCH_ENV = "STACKLESS_TESTSUITE_SOFTSWITCH"
+
+
+def softswitch_from_environment():
+    """Set the switching mode given by STACKLESS_TESTSUITE_SOFTSWITCH, if any"""
+    value = os.environ.get(SOFTSWITCH_ENV)
+    if value and hasattr(stackless, "enable_softswitch"):
+        stackless.enable_softswitch(value.lower() not in ("0", "false", "no", "off", "hard"))
+
+
+# Set the environment variable STACKLESS_TESTSUITE_STRESS to the maximum
+# number of tasklets (i.e. 1000000) to enable the stress tests.
+try:
+    STRESS_SIZE = int(os.environ.get("STACKLESS_TESTSUITE_STRESS") or 0)
+except ValueError:
+    STRESS_SIZE = 0
+
+
+def require_stress(testcase):
+    return unittest.skipUnless(STRESS_SIZE, "Stress test, set STACKLESS_TESTSUITE_STRESS to run it")(testcase)
+
+
+def kill_scheduled_tasklets():
+    """Kill all tasklets in the run queue except the main tasklet"""
+    mainTasklet = stackless.getmain()
+    current = mainTasklet.next
+    while current is not None and current is not mainTasklet:
+        next_ = current.next
+        current.kill()
+        current = next_
+
+
 def require_one_thread(testcase):
-    if withThreads:
-        return unittest.skipIf(threading.active_count() > 1, "Test requires, that only a single thread is active")(testcase)
-    return testcase
+    """Skip the test, if another thread is active, when the test runs"""
+    if not withThreads:
+        return testcase
+
+    # check at run time: i.e. the sampling profiler starts its thread after
+    # the test modules have been imported
+    @functools.wraps(testcase)
+    def wrapper(self, *args, **kwargs):
+        if threading.active_count() > 1:
+            self.skipTest("Test requires, that only a single thread is active")
+        return testcase(self, *args, **kwargs)
+    return wrapper
 
 
 class StacklessTestCaseMixin(object):
@@ -241,12 +410,7 @@ class StacklessTestCase(unittest.TestCase, StacklessTestCaseMixin):
         # Tasklets created in pickling tests can be left in the scheduler when they finish.  We can feel free to
         # clean them up for the tests.  Any tests that expect to exit with no leaked tasklets should do explicit
         # assertions to check.
-        mainTasklet = stackless.getmain()
-        current = mainTasklet.next
-        while current is not None and current is not mainTasklet:
-            next_ = current.next
-            current.kill()
-            current = next_
+        kill_scheduled_tasklets()
         run_count = stackless.getruncount()
         self.assertEqual(run_count, 1, "Leakage from this test, with %d tasklets still in the scheduler" % (run_count - 1))
         if withThreads:
@@ -263,6 +427,51 @@ class StacklessTestCase(unittest.TestCase, StacklessTestCaseMixin):
                 active_count = threading.active_count()
             self.assertEqual(active_count, expected_thread_count, "Leakage from other threads, with %d threads running (%d expected)" % (active_count, expected_thread_count))
 
+    def run(self, result=None):
+        if leaks.LEAK_REPEAT >= 3:
+            self.__repeat_for_leak_check()
+        # record or replay the scheduler events, see stackless_testsuite.trace
+        with trace.session_from_environment(self.id()) as tracer:
+            # cleanups run in reverse order, the check runs after those of the test
+            self.addCleanup(tracer.check)
+            return self.__run_instrumented(result)
+
+    def __run_instrumented(self, result):
+        if not instrument.INSTRUMENT_FILE:
+            return super(StacklessTestCase, self).run(result)
+        # count the scheduler events of this test, see stackless_testsuite.instrument
+        counter = instrument.SchedulerCounter()
+        if not counter.install():
+            return super(StacklessTestCase, self).run(result)
+        try:
+            return super(StacklessTestCase, self).run(result)
+        finally:
+            counter.uninstall()
+            instrument.record(self.id(), counter)
+
+    def __repeat_for_leak_check(self):
+        # run the test LEAK_REPEAT - 1 times, the last sample gets taken in a cleanup
+        # of the real run. See stackless_testsuite.leaks
+        detector = leaks.LeakDetector()
+        detector.start()
+        for i in range(detector.repeat - 1):  # @UnusedVariable
+            result = unittest.TestResult()
+            super(StacklessTestCase, self).run(result)
+            if result.skipped or not result.wasSuccessful():
+                detector.stop()
+                return
+            detector.sample()
+        self.addCleanup(self.__check_leaks, detector)
+
+    def __check_leaks(self, detector):
+        try:
+            detector.sample()
+        finally:
+            detector.stop()
+        leak = detector.check()
+        if leak:
+            self.fail(leak)
+
     def __strip_attributes(self):
         # Remove non standard attributes. They could render the test case object unpickleable.
         # This is a hack, but it works fairly well.
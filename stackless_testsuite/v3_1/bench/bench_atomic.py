@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Atomic section benchmarks
+
+Compare the cost of a critical section protected by tasklet.set_atomic()
+(as in test_watchdog.runtask_atomic_helper), by the stackless.atomic()
+context manager (see test_functionality.AtomicTest) and by a
+threading.Lock. The preemption benchmark runs atomic sections under the
+watchdog of stackless.run(n) and measures, how much they delay the
+preemption compared to the same work without atomic sections.
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import sys
+import threading
+import stackless
+from stackless_testsuite.bench import Benchmark, clock, percentile, main
+from stackless_testsuite.v3_1.bench.bench_watchdog import TimedScheduler, NAMES
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1.bench  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1.bench"  # @ReservedAssignment
+
+try:
+    xrange
+except NameError:
+    xrange = range  # @ReservedAssignment
+
+# iterations of the loop inside a critical section
+WORK = (0, 10, 100)
+
+
+def plain_section(loops, work):
+    t0 = clock()
+    for i in xrange(loops):  # @UnusedVariable
+        for j in xrange(work):  # @UnusedVariable
+            pass
+    return clock() - t0
+
+
+def set_atomic_section(loops, work):
+    current = stackless.getcurrent()
+    set_atomic = current.set_atomic
+    t0 = clock()
+    for i in xrange(loops):  # @UnusedVariable
+        hold = set_atomic(1)
+        for j in xrange(work):  # @UnusedVariable
+            pass
+        set_atomic(hold)
+    return clock() - t0
+
+
+def atomic_ctx_section(loops, work):
+    atomic = stackless.atomic
+    t0 = clock()
+    for i in xrange(loops):  # @UnusedVariable
+        with atomic():
+            for j in xrange(work):  # @UnusedVariable
+                pass
+    return clock() - t0
+
+
+def lock_section(loops, work):
+    lock = threading.Lock()
+    t0 = clock()
+    for i in xrange(loops):  # @UnusedVariable
+        with lock:
+            for j in xrange(work):  # @UnusedVariable
+                pass
+    return clock() - t0
+
+
+SECTIONS = {"none": plain_section,
+            "set_atomic": set_atomic_section,
+            "atomic_ctx": atomic_ctx_section,
+            "lock": lock_section,
+            }
+
+
+def critical_section(loops, method, work):
+    """Enter and leave a critical section *loops* times"""
+    return SECTIONS[method](loops, work)
+
+
+def atomic_worker(count, rounds):
+    current = stackless.getcurrent()
+    for i in xrange(rounds):  # @UnusedVariable
+        hold = current.set_atomic(1)
+        for j in xrange(count):  # @UnusedVariable
+            pass
+        current.set_atomic(hold)
+
+
+def plain_worker(count, rounds):
+    for i in xrange(rounds):  # @UnusedVariable
+        for j in xrange(count):  # @UnusedVariable
+            pass
+
+
+def preemption(loops, atomic, count, budget):
+    """Run tasklets with sections of *count* iterations under a watchdog with the given *budget*"""
+    worker = atomic_worker if atomic else plain_worker
+    rounds = max(1, 10000 // count)
+    elapsed = 0.0
+    slices = []
+    schedule_count = 0
+    for i in xrange(loops):  # @UnusedVariable
+        for name in NAMES:  # @UnusedVariable
+            stackless.tasklet(worker)(count, rounds)
+        scheduler = TimedScheduler(budget, True, ignore_nesting=True)
+        t0 = clock()
+        scheduler.autoschedule()
+        elapsed += clock() - t0
+        slices.extend(scheduler.slices)
+        schedule_count += scheduler.get_schedule_count()
+    slices.sort()
+    return elapsed, {"slices": schedule_count / loops,
+                     "slice_p50_ns": percentile(slices, 50),
+                     "slice_p99_ns": percentile(slices, 99),
+                     "slice_max_ns": slices[-1] if slices else None,
+                     }
+
+
+BENCHMARKS = [
+    Benchmark("atomic.critical_section", critical_section, 200000, unit="section",
+              params={"method": sorted(SECTIONS), "work": WORK}),
+    Benchmark("atomic.preemption", preemption, 20, unit="workload",
+              params={"atomic": (False, True),
+                      "count": (1, 10, 100, 500),
+                      "budget": (100, 1000)}),
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main(BENCHMARKS, description=__doc__))
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Instruction budget benchmarks
+
+Run scheduler workloads under the watchdog of stackless.run(budget,
+totaltimeout=True) and count the slices the workload needs, like
+SimpleScheduler.get_schedule_count() does in test_watchdog. With a total
+timeout every slice executes *budget* instructions, independent of the
+tasklet switches in between. The cost in slices hardly depends on the load
+of the host and the results are suitable to gate changes of the scheduler
+and channel paths. The "runtask" workload (test_watchdog.runtask) is plain
+Python code and serves as reference for the interpreter itself.
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import sys
+import stackless
+from stackless_testsuite.bench import Benchmark, clock, main
+from stackless_testsuite.v3_1.bench.bench_watchdog import TimedScheduler
+from stackless_testsuite.v3_1.test_watchdog import runtask
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1.bench  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1.bench"  # @ReservedAssignment
+
+try:
+    xrange
+except NameError:
+    xrange = range  # @ReservedAssignment
+
+BUDGETS = (100, 1000)
+
+
+#
+# Workloads: create the tasklets, the scheduler runs them
+#
+def schedule_workload(loops):
+    """Two tasklets call stackless.schedule() *loops* times"""
+    def worker():
+        for i in xrange(loops):  # @UnusedVariable
+            stackless.schedule()
+    stackless.tasklet(worker)()
+    stackless.tasklet(worker)()
+
+
+def channel_workload(loops):
+    """Two tasklets exchange *loops* round trips"""
+    ping = stackless.channel()
+    pong = stackless.channel()
+
+    def client():
+        for i in xrange(loops):
+            ping.send(i)
+            pong.receive()
+
+    def echo():
+        for i in xrange(loops):  # @UnusedVariable
+            pong.send(ping.receive())
+    stackless.tasklet(echo)()
+    stackless.tasklet(client)()
+
+
+def send_sequence_workload(loops):
+    """A tasklet transfers *loops* items using channel.send_sequence()"""
+    c = stackless.channel()
+
+    def receiver():
+        for i in xrange(loops):  # @UnusedVariable
+            c.receive()
+    stackless.tasklet(receiver)()
+    stackless.tasklet(c.send_sequence)(xrange(loops))
+
+
+def create_workload(loops):
+    """A tasklet creates and runs *loops* short lived tasklets"""
+    def child():
+        pass
+
+    def spawner():
+        for i in xrange(loops):  # @UnusedVariable
+            stackless.tasklet(child)().run()
+    stackless.tasklet(spawner)()
+
+
+def runtask_workload(loops):
+    """A tasklet calls test_watchdog.runtask *loops* times"""
+    def worker():
+        for i in xrange(loops):  # @UnusedVariable
+            runtask("budget")
+    stackless.tasklet(worker)()
+
+
+WORKLOADS = {"schedule": (schedule_workload, 2),
+             "channel": (channel_workload, 2),
+             "send_sequence": (send_sequence_workload, 1),
+             "create": (create_workload, 1),
+             "runtask": (runtask_workload, 1),
+             }
+
+
+def budget_slices(loops, workload, budget):
+    """Return the number of slices of *budget* instructions, the workload needs"""
+    WORKLOADS[workload][0](loops)
+    scheduler = TimedScheduler(budget, False, totaltimeout=True, ignore_nesting=True)
+    t0 = clock()
+    scheduler.autoschedule()
+    elapsed = clock() - t0
+    slices = scheduler.get_schedule_count()
+    return slices, {"instructions": slices * budget,
+                    "seconds": elapsed,
+                    }
+
+
+def _ops_per_loop(params):
+    return WORKLOADS[params["workload"]][1]
+
+BENCHMARKS = [
+    Benchmark("budget.slices", budget_slices, 10000, unit="op", ops_per_loop=_ops_per_loop,
+              params={"workload": sorted(WORKLOADS), "budget": BUDGETS}, measure="slices"),
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main(BENCHMARKS, description=__doc__))
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Deadlock detection benchmarks
+
+Run the scenarios of test_watchdog.TestDeadlock and measure the latency
+from the moment the last runnable tasklet ends (or blocks) until the
+exception reaches the blocked main tasklet. Additional tasklets blocked on
+an unrelated channel show, how the cost of the check grows with the number
+of blocked tasklets.
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import sys
+import threading
+import stackless
+from stackless_testsuite.bench import Benchmark, BenchmarkSkipped, clock, clock_ns, percentile, main
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1.bench  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1.bench"  # @ReservedAssignment
+
+try:
+    xrange
+except NameError:
+    xrange = range  # @ReservedAssignment
+
+BLOCKED = (0, 10, 100, 1000, 10000)
+
+
+def wait(channel):
+    channel.receive()
+
+
+#
+# Scenarios: each returns the latency in nanoseconds and appends the
+# tasklets, it leaves blocked, to *leftover*
+#
+def receive_on_main(stamp, leftover):
+    """TestDeadlock.testReceiveOnMain: main blocks with an empty run queue"""
+    c = stackless.channel()
+    stamp[0] = clock_ns()
+    try:
+        c.receive()
+    except RuntimeError:
+        return clock_ns() - stamp[0]
+    raise RuntimeError("no deadlock")
+
+
+def tasklet_ends(stamp, leftover):
+    """TestDeadlock.test_main_receiving_endttasklet: the last tasklet ends"""
+    def task():
+        stamp[0] = clock_ns()
+    stackless.tasklet(task)()
+    try:
+        stackless.channel().receive()
+    except RuntimeError:
+        return clock_ns() - stamp[0]
+    raise RuntimeError("no deadlock")
+
+
+def tasklet_raises(stamp, leftover):
+    """TestDeadlock.test_main_gets_exception: the last tasklet raises an exception"""
+    def task():
+        stamp[0] = clock_ns()
+        raise ZeroDivisionError("mumbai")
+    stackless.tasklet(task)()
+    try:
+        stackless.channel().receive()
+    except ZeroDivisionError:
+        return clock_ns() - stamp[0]
+    raise RuntimeError("no exception")
+
+
+def tasklet_blocks(stamp, leftover):
+    """TestDeadlock.test_tasklet_and_main_receive: the last tasklet blocks"""
+    def task():
+        c = stackless.channel()
+        stamp[0] = clock_ns()
+        c.receive()
+    leftover.append(stackless.tasklet(task)())
+    try:
+        stackless.channel().receive()
+    except RuntimeError:
+        return clock_ns() - stamp[0]
+    raise RuntimeError("no deadlock")
+
+
+SCENARIOS = {"receive_on_main": receive_on_main,
+             "tasklet_ends": tasklet_ends,
+             "tasklet_raises": tasklet_raises,
+             "tasklet_blocks": tasklet_blocks,
+             }
+
+
+def deadlock(loops, scenario, blocked):
+    """Execute *scenario* *loops* times with *blocked* additional tasklets waiting on a channel"""
+    if threading.active_count() > 1:
+        raise BenchmarkSkipped("deadlock detection requires a single thread")
+    func = SCENARIOS[scenario]
+    c = stackless.channel()
+    waiting = [stackless.tasklet(wait)(c) for i in xrange(blocked)]
+    stackless.run()
+    stamp = [0]
+    samples = []
+    append = samples.append
+    leftover = []
+    cleanup = 0.0
+    try:
+        t0 = clock()
+        for i in xrange(loops):  # @UnusedVariable
+            append(func(stamp, leftover))
+            if leftover:
+                # keep the number of blocked tasklets constant, untimed
+                t1 = clock()
+                for t in leftover:
+                    t.kill()
+                del leftover[:]
+                cleanup += clock() - t1
+        elapsed = clock() - t0 - cleanup
+    finally:
+        for t in waiting + leftover:
+            t.kill()
+    samples.sort()
+    return elapsed, {"p50_ns": percentile(samples, 50),
+                     "p99_ns": percentile(samples, 99),
+                     "p999_ns": percentile(samples, 99.9),
+                     }
+
+
+BENCHMARKS = [
+    Benchmark("deadlock.latency", deadlock, 10000, unit="deadlock",
+              params={"scenario": sorted(SCENARIOS),
+                      "blocked": BLOCKED}),
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main(BENCHMARKS, description=__doc__))
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Exception transport benchmarks
+
+Raise exceptions across channels (channel.send_exception and
+channel.send_throw, see test_channel.testSendException and testSendThrow)
+and into tasklets (tasklet.raise_exception and tasklet.throw, see
+tasklet/test_functionality.py). The receiving tasklet waits at a given
+recursion depth. With "traceback", the sender raises the exception at the
+same depth and transports sys.exc_info() like AsTaskletTestCase.run does.
+The metric "alloc_bytes" is the peak memory traced by tracemalloc during a
+single transport.
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import sys
+import stackless
+from stackless_testsuite.bench import Benchmark, BenchmarkSkipped, clock, main
+from stackless_testsuite.v3_1.bench.bench_switching import recurse_level_then_do
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1.bench  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1.bench"  # @ReservedAssignment
+
+try:
+    xrange
+except NameError:
+    xrange = range  # @ReservedAssignment
+
+DEPTHS = (0, 10, 100)
+
+# number of transports traced by tracemalloc
+ALLOC_SAMPLES = 20
+
+
+class TransportError(Exception):
+    pass
+
+
+def raise_at(depth):
+    if depth:
+        raise_at(depth - 1)
+    raise TransportError("transported")
+
+
+def exc_info_at(depth):
+    """Return the exc_info of an exception raised *depth* frames deeper"""
+    try:
+        raise_at(depth)
+    except TransportError:
+        return sys.exc_info()
+
+
+#
+# Receivers: catch exceptions in a loop at recursion depth *depth*
+#
+def channel_receiver(channel, counter):
+    while True:
+        try:
+            channel.receive()
+        except TransportError:
+            counter[0] += 1
+
+
+def paused_receiver(counter):
+    while True:
+        try:
+            stackless.schedule_remove()
+        except TransportError:
+            counter[0] += 1
+
+
+#
+# Senders: transport a single exception
+#
+def make_sender(method, target, depth, traceback):
+    if method == "send_exception":
+        def send():
+            target.send_exception(TransportError, "transported")
+    elif method == "send_throw":
+        if traceback:
+            def send():
+                target.send_throw(*exc_info_at(depth))
+        else:
+            def send():
+                target.send_throw(TransportError, TransportError("transported"))
+    elif method == "raise_exception":
+        def send():
+            target.raise_exception(TransportError, "transported")
+    elif method == "throw":
+        if traceback:
+            def send():
+                target.throw(*exc_info_at(depth))
+        else:
+            def send():
+                target.throw(TransportError, TransportError("transported"))
+    else:
+        raise ValueError(method)
+    return send
+
+
+WITHOUT_TRACEBACK = ("send_exception", "raise_exception")
+
+
+def measure_alloc(send):
+    if tracemalloc is None or tracemalloc.is_tracing():
+        return None
+    total = 0
+    for i in xrange(ALLOC_SAMPLES):  # @UnusedVariable
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            send()
+            total += tracemalloc.get_traced_memory()[1] - before
+        finally:
+            tracemalloc.stop()
+    return total / ALLOC_SAMPLES
+
+
+def transport(loops, method, depth, traceback, target_factory):
+    if traceback and method in WITHOUT_TRACEBACK:
+        raise BenchmarkSkipped("%s does not transport a traceback" % (method,))
+    counter = [0]
+    target, receiver = target_factory(depth, counter)
+    try:
+        send = make_sender(method, target, depth, traceback)
+        t0 = clock()
+        for i in xrange(loops):  # @UnusedVariable
+            send()
+        elapsed = clock() - t0
+        alloc = measure_alloc(send)
+    finally:
+        receiver.kill()
+    if counter[0] != loops + (ALLOC_SAMPLES if alloc is not None else 0):
+        raise RuntimeError("lost exceptions, the receiver caught %d" % (counter[0],))
+    return elapsed, {"alloc_bytes": alloc}
+
+
+def channel_target(depth, counter):
+    c = stackless.channel()
+    # the default preference -1 switches to the receiver, it catches the exception and blocks again
+    receiver = stackless.tasklet(recurse_level_then_do)(depth, channel_receiver, c, counter)
+    receiver.run()
+    return c, receiver
+
+
+def tasklet_target(depth, counter):
+    receiver = stackless.tasklet(recurse_level_then_do)(depth, paused_receiver, counter)
+    receiver.run()
+    return receiver, receiver
+
+
+def channel_exception(loops, method, depth, traceback):
+    """The receiver waits in channel.receive()"""
+    return transport(loops, method, depth, traceback, channel_target)
+
+
+def tasklet_exception(loops, method, depth, traceback):
+    """The receiver is paused in stackless.schedule_remove()"""
+    return transport(loops, method, depth, traceback, tasklet_target)
+
+
+BENCHMARKS = [
+    Benchmark("exception.channel", channel_exception, 20000, unit="exception",
+              params={"method": ("send_exception", "send_throw"),
+                      "depth": DEPTHS,
+                      "traceback": (False, True)}),
+    Benchmark("exception.tasklet", tasklet_exception, 20000, unit="exception",
+              params={"method": ("raise_exception", "throw"),
+                      "depth": DEPTHS,
+                      "traceback": (False, True)}),
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main(BENCHMARKS, description=__doc__))
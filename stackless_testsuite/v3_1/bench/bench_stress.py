@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Scheduler scale benchmarks
+
+Fill the run queue or a channel with up to STACKLESS_TESTSUITE_STRESS
+tasklets and measure getruncount(), the traversal of tasklet.next and
+tasklet.prev, running the queue, passing messages and the kill loop of
+StacklessTestCase.tearDown. The benchmarks are skipped unless the
+environment variable STACKLESS_TESTSUITE_STRESS is set.
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import sys
+import stackless
+from stackless_testsuite.bench import Benchmark, BenchmarkSkipped, clock, main
+from stackless_testsuite.util import STRESS_SIZE, kill_scheduled_tasklets
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1.bench  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1.bench"  # @ReservedAssignment
+
+try:
+    xrange
+except NameError:
+    xrange = range  # @ReservedAssignment
+
+SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+
+
+def nop():
+    pass
+
+
+def wait(channel):
+    channel.receive()
+
+
+def check_size(tasklets):
+    if tasklets > STRESS_SIZE:
+        raise BenchmarkSkipped("%d tasklets exceed STACKLESS_TESTSUITE_STRESS=%d" % (tasklets, STRESS_SIZE))
+
+
+def fill_run_queue(tasklets):
+    tasklet = stackless.tasklet
+    return [tasklet(nop)() for i in xrange(tasklets)]
+
+
+def fill_channel(tasklets):
+    c = stackless.channel()
+    tasklet = stackless.tasklet
+    tlets = [tasklet(wait)(c) for i in xrange(tasklets)]
+    stackless.run()
+    return c, tlets
+
+
+def getruncount(loops, tasklets):
+    """getruncount() with a full run queue, the unit is a single call"""
+    check_size(tasklets)
+    tlets = fill_run_queue(tasklets)  # @UnusedVariable
+    get = stackless.getruncount
+    t0 = clock()
+    for i in xrange(loops):  # @UnusedVariable
+        get()
+    return clock() - t0
+
+
+def traverse_next(loops, tasklets):
+    """Walk the run queue using tasklet.next"""
+    check_size(tasklets)
+    tlets = fill_run_queue(tasklets)  # @UnusedVariable
+    main = stackless.getmain()
+    t0 = clock()
+    for i in xrange(loops):  # @UnusedVariable
+        current = main.next
+        while current is not main:
+            current = current.next
+    return clock() - t0
+
+
+def traverse_prev(loops, tasklets):
+    """Walk the run queue using tasklet.prev"""
+    check_size(tasklets)
+    tlets = fill_run_queue(tasklets)  # @UnusedVariable
+    main = stackless.getmain()
+    t0 = clock()
+    for i in xrange(loops):  # @UnusedVariable
+        current = main.prev
+        while current is not main:
+            current = current.prev
+    return clock() - t0
+
+
+def run_queue(loops, tasklets):
+    """Run a full run queue using stackless.run()"""
+    check_size(tasklets)
+    elapsed = 0.0
+    for i in xrange(loops):  # @UnusedVariable
+        tlets = fill_run_queue(tasklets)  # @UnusedVariable
+        t0 = clock()
+        stackless.run()
+        elapsed += clock() - t0
+    return elapsed
+
+
+def send_blocked(loops, tasklets):
+    """Send a message to each tasklet blocked on a single channel"""
+    check_size(tasklets)
+    elapsed = 0.0
+    for i in xrange(loops):  # @UnusedVariable
+        c, tlets = fill_channel(tasklets)  # @UnusedVariable
+        c.preference = 1
+        send = c.send
+        t0 = clock()
+        for j in xrange(tasklets):  # @UnusedVariable
+            send(None)
+        elapsed += clock() - t0
+    return elapsed
+
+
+def kill_loop(loops, tasklets):
+    """The kill loop of StacklessTestCase.tearDown"""
+    check_size(tasklets)
+    elapsed = 0.0
+    for i in xrange(loops):  # @UnusedVariable
+        tlets = fill_run_queue(tasklets)  # @UnusedVariable
+        t0 = clock()
+        kill_scheduled_tasklets()
+        elapsed += clock() - t0
+    return elapsed
+
+
+def kill_blocked(loops, tasklets):
+    """Kill tasklets blocked on a single channel"""
+    check_size(tasklets)
+    elapsed = 0.0
+    for i in xrange(loops):  # @UnusedVariable
+        c, tlets = fill_channel(tasklets)  # @UnusedVariable
+        t0 = clock()
+        for t in tlets:
+            t.kill()
+        elapsed += clock() - t0
+    return elapsed
+
+
+def _tasklets(params):
+    return params["tasklets"]
+
+SIZE_PARAMS = {"tasklets": SIZES}
+
+BENCHMARKS = [Benchmark("stress.getruncount", getruncount, 100000, unit="call", params=SIZE_PARAMS)]
+BENCHMARKS.extend(Benchmark("stress." + func.__name__, func, 1, unit="tasklet",
+                            ops_per_loop=_tasklets, params=SIZE_PARAMS)
+                  for func in (traverse_next, traverse_prev, run_queue, send_blocked, kill_loop, kill_blocked))
+
+
+if __name__ == "__main__":
+    sys.exit(main(BENCHMARKS, description=__doc__))
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Context switch latency benchmarks
+
+Two tasklets switch back and forth at a given recursion depth. Each tasklet
+records the time from the last time stamp taken by its partner right before
+switching until it resumes. The benchmarks report the percentiles of these
+latencies in nanoseconds for soft and for hard switching.
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import sys
+import stackless
+from stackless_testsuite.bench import Benchmark, BenchmarkSkipped, CONTEXTS, clock, clock_ns, percentile, main
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1.bench  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1.bench"  # @ReservedAssignment
+
+try:
+    xrange
+except NameError:
+    xrange = range  # @ReservedAssignment
+
+# the recursion levels used by test_watchdog.runtask5
+DEPTHS = (1, 10, 100, 500)
+
+
+def recurse_level_then_do(count, func, *args):
+    """Like test_watchdog.recurse_level_then_do_schedule, but call *func*"""
+    if count == 0:
+        func(*args)
+    else:
+        recurse_level_then_do(count - 1, func, *args)
+
+
+def clock_overhead(loops):
+    """The time needed to take a sample without switching"""
+    samples = []
+    append = samples.append
+    stamp = [0]
+    for i in xrange(loops):  # @UnusedVariable
+        stamp[0] = clock_ns()
+        append(clock_ns() - stamp[0])
+    samples.sort()
+    return percentile(samples, 50)
+
+
+class SwitchPair(object):
+    """Two tasklets, that switch to each other *loops* times
+
+    Subclasses define the method switch(me, other), that transfers control
+    from tasklet number *me* to tasklet number *other*.
+    """
+
+    # the order in which the workers get created and start running
+    start_order = (0, 1)
+
+    def __init__(self, loops, depth):
+        self.loops = loops
+        self.depth = depth
+        self.stamp = [0]
+        self.samples = []
+        self.tasklets = [None, None]
+        self.running = 2
+        self.done = stackless.channel()
+
+    def loop(self, me, other):
+        stamp = self.stamp
+        append = self.samples.append
+        switch = self.switch
+        for i in xrange(self.loops):  # @UnusedVariable
+            stamp[0] = clock_ns()
+            switch(me, other)
+            append(clock_ns() - stamp[0])
+        if self.running == 1:
+            # the partner has ended, the last sample includes its termination
+            self.samples.pop()
+        self.finish(me, other)
+
+    def finish(self, me, other):
+        self.running -= 1
+        if not self.running:
+            self.done.send(None)
+
+    def worker(self, me, other):
+        recurse_level_then_do(self.depth, self.loop, me, other)
+
+    def measure(self):
+        for me in self.start_order:
+            self.tasklets[me] = stackless.tasklet(self.worker)(me, 1 - me)
+        t0 = clock()
+        # the main tasklet blocks, only the two workers remain runnable
+        self.done.receive()
+        return clock() - t0
+
+
+class SchedulePair(SwitchPair):
+    def switch(self, me, other):
+        stackless.schedule()
+
+
+class TaskletSwitchPair(SwitchPair):
+    def switch(self, me, other):
+        self.tasklets[other].switch()
+
+    def finish(self, me, other):
+        partner = self.tasklets[other]
+        if partner.alive:
+            # tasklet.switch() paused the partner
+            partner.insert()
+        super(TaskletSwitchPair, self).finish(me, other)
+
+
+class TaskletRunPair(SwitchPair):
+    def switch(self, me, other):
+        self.tasklets[other].run()
+
+
+class ChannelPair(SwitchPair):
+    # worker 1 must block on receive, before worker 0 sends
+    start_order = (1, 0)
+
+    def __init__(self, loops, depth):
+        super(ChannelPair, self).__init__(loops, depth)
+        self.channels = [stackless.channel(), stackless.channel()]
+        for c in self.channels:
+            c.preference = -1  # receiver priority: hand-off on send
+
+    def loop(self, me, other):
+        stamp = self.stamp
+        append = self.samples.append
+        send = self.channels[other].send
+        receive = self.channels[me].receive
+        if me == 1:
+            receive()
+            append(clock_ns() - stamp[0])
+        for i in xrange(self.loops):  # @UnusedVariable
+            stamp[0] = clock_ns()
+            send(i)
+            if me == 0 or i < self.loops - 1:
+                receive()
+                append(clock_ns() - stamp[0])
+        self.finish(me, other)
+
+
+def enable_softswitch(flag):
+    try:
+        return stackless.enable_softswitch(flag)
+    except AttributeError:
+        if flag:
+            raise BenchmarkSkipped("this implementation does not support soft switching")
+        return False
+
+
+def make_benchmark(pair_class):
+    def benchmark(loops, depth, softswitch):
+        old = enable_softswitch(softswitch)
+        try:
+            pair = pair_class(loops, depth)
+            seconds = pair.measure()
+        finally:
+            enable_softswitch(old)
+        samples = sorted(pair.samples)
+        overhead = clock_overhead(1000)
+        return seconds, {"samples": len(samples),
+                         "clock_overhead_ns": overhead,
+                         "min_ns": samples[0] if samples else None,
+                         "p50_ns": percentile(samples, 50),
+                         "p99_ns": percentile(samples, 99),
+                         "p999_ns": percentile(samples, 99.9),
+                         }
+    return benchmark
+
+
+SWITCH_PARAMS = {"depth": DEPTHS,
+                 "softswitch": (True, False),
+                 }
+
+BENCHMARKS = [Benchmark("switch." + name, make_benchmark(cls), 20000, unit="switch", ops_per_loop=2,
+                        params=SWITCH_PARAMS, contexts=CONTEXTS)
+              for name, cls in (("schedule", SchedulePair),
+                                ("tasklet_switch", TaskletSwitchPair),
+                                ("tasklet_run", TaskletRunPair),
+                                ("channel", ChannelPair))]
+
+
+if __name__ == "__main__":
+    sys.exit(main(BENCHMARKS, description=__doc__))
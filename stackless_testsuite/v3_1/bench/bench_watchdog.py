@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Watchdog benchmarks
+
+Run the workload of test_watchdog.TestWatchdog.run_tasklets under the
+watchdog of SimpleScheduler.autoschedule() and measure how many
+instructions and nanoseconds elapse per slice compared to the requested
+budget, and the overhead of the watchdog loop.
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import sys
+import stackless
+from stackless_testsuite.bench import Benchmark, clock, clock_ns, percentile, main
+from stackless_testsuite.v3_1.test_watchdog import SimpleScheduler, runtask
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1.bench  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1.bench"  # @ReservedAssignment
+
+try:
+    xrange
+except NameError:
+    xrange = range  # @ReservedAssignment
+
+NAMES = ("t1", "t2", "t3")
+
+
+class TimedScheduler(SimpleScheduler):
+    """A SimpleScheduler, that records the duration of every slice"""
+
+    def __init__(self, bytecodes=25, softSchedule=False, totaltimeout=False, ignore_nesting=False):
+        super(TimedScheduler, self).__init__(bytecodes, softSchedule)
+        self.totaltimeout = totaltimeout
+        self.ignore_nesting = ignore_nesting
+        self.slices = []
+        self.loop_overhead = 0
+
+    def autoschedule(self):
+        run = stackless.run
+        append = self.slices.append
+        while stackless.runcount > 1:
+            t0 = clock_ns()
+            try:
+                returned = run(self.bytecodes, soft=self.softSchedule,
+                               totaltimeout=self.totaltimeout, ignore_nesting=self.ignore_nesting)
+            except Exception:
+                while stackless.runcount > 1:
+                    stackless.current.next.kill()
+                raise
+            t1 = clock_ns()
+            append(t1 - t0)
+            self.schedule_cb(returned)
+            self.loop_overhead += clock_ns() - t1
+
+
+def nested(name):
+    """runtask called from C code, the tasklet can't be soft switched"""
+    return list(map(runtask, [name]))
+
+
+WORKLOADS = {"runtask": runtask,
+             "nested": nested,
+             }
+
+
+def count_instructions(func, *args):
+    """Count the byte code instructions executed by func(*args) or return None"""
+    counter = [0]
+
+    def tracer(frame, event, arg):
+        frame.f_trace_opcodes = True
+        if event == "opcode":
+            counter[0] += 1
+        return tracer
+
+    if sys.version_info < (3, 7):
+        # no opcode events
+        return None
+    old = sys.gettrace()
+    sys.settrace(tracer)
+    try:
+        func(*args)
+    finally:
+        sys.settrace(old)
+    return counter[0]
+
+
+def start_tasklets(func):
+    return [stackless.tasklet(func)(name) for name in NAMES]
+
+
+def watchdog(loops, workload, budget, soft, totaltimeout, ignore_nesting):
+    """Execute the workload *loops* times using a watchdog with the given *budget*"""
+    func = WORKLOADS[workload]
+    instructions = count_instructions(func, "count")
+    if instructions is not None:
+        instructions *= len(NAMES)
+
+    elapsed = plain = 0.0
+    slices = []
+    schedule_count = loop_overhead = 0
+    for i in xrange(loops):  # @UnusedVariable
+        # the same workload without the watchdog
+        start_tasklets(func)
+        t0 = clock()
+        stackless.run()
+        plain += clock() - t0
+
+        start_tasklets(func)
+        scheduler = TimedScheduler(budget, soft, totaltimeout, ignore_nesting)
+        t0 = clock()
+        scheduler.autoschedule()
+        elapsed += clock() - t0
+        slices.extend(scheduler.slices)
+        schedule_count += scheduler.get_schedule_count()
+        loop_overhead += scheduler.loop_overhead
+
+    slices.sort()
+    slices_per_workload = schedule_count / loops
+    metrics = {"slices": slices_per_workload,
+               "slice_p50_ns": percentile(slices, 50),
+               "slice_p99_ns": percentile(slices, 99),
+               "loop_overhead_ns": loop_overhead / schedule_count,
+               "watchdog_overhead_ns": (elapsed - plain) * 1e9 / schedule_count,
+               "instructions_per_slice": None,
+               "budget_ratio": None,
+               }
+    if instructions is not None:
+        metrics["instructions_per_slice"] = instructions / slices_per_workload
+        metrics["budget_ratio"] = metrics["instructions_per_slice"] / budget
+    return elapsed, metrics
+
+
+BENCHMARKS = [
+    Benchmark("watchdog.slice", watchdog, 20, unit="workload",
+              params={"workload": sorted(WORKLOADS),
+                      "budget": (10, 100, 1000, 10000),
+                      "soft": (False, True),
+                      "totaltimeout": (False, True),
+                      "ignore_nesting": (False, True)}),
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main(BENCHMARKS, description=__doc__))
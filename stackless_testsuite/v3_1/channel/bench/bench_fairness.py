@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Channel fairness analysis
+
+Producers and consumers exchange messages over a single channel until
+*loops* messages have been transferred. The benchmark records the order in
+which the producers and consumers get served and reports per group
+
+- the Jain fairness index of the number of services per tasklet (1.0 is
+  perfectly fair, 1/n means a single tasklet got all services),
+- the maximum time a tasklet waited in a single send or receive call,
+- the number of starvation events: a tasklet waited for more than
+  STARVATION_FACTOR * n services of the other tasklets of its group.
+
+With a timeslice, the tasklets run under a watchdog as in
+test_watchdog.TestWatchdogSoft.test_channelchain.
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import sys
+import stackless
+from stackless_testsuite.bench import Benchmark, clock, clock_ns, main
+from stackless_testsuite.v3_1.channel.bench.bench_throughput import CHANNEL_PARAMS, make_channel
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1.channel.bench  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1.channel.bench"  # @ReservedAssignment
+
+try:
+    xrange  # @UndefinedVariable
+except NameError:
+    xrange = range  # @ReservedAssignment
+
+# (producers, consumers)
+TOPOLOGIES = {"one_to_one": (1, 1),
+              "fan_in": (4, 1),
+              "fan_out": (1, 4),
+              "many_to_many": (4, 4),
+              }
+
+STARVATION_FACTOR = 2
+
+# iterations of the busy loop between two channel operations
+WORK = 20
+
+
+def jain_index(counts):
+    """Jain's fairness index of *counts*"""
+    total = sum(counts)
+    squares = sum(x * x for x in counts)
+    if not squares:
+        return None
+    return total * total / (len(counts) * squares)
+
+
+def starvation_events(order, n, factor=STARVATION_FACTOR):
+    """Count the gaps of more than *factor* * *n* services between two services of a tasklet
+
+    *order* is the sequence of the indices of the served tasklets, *n* the
+    number of tasklets. A tasklet, that never got served, counts as a single
+    event, if the sequence is longer than the limit.
+    """
+    limit = factor * n
+    last = {}
+    events = 0
+    for position, index in enumerate(order):
+        if position - last.get(index, -1) - 1 > limit:
+            events += 1
+        last[index] = position
+    for index in xrange(n):
+        if len(order) - last.get(index, -1) - 1 > limit:
+            events += 1
+    return events
+
+
+def analyze(order, n, waits):
+    """Return the fairness metrics of a group of *n* tasklets"""
+    counts = [0] * n
+    for index in order:
+        counts[index] += 1
+    return {"jain": jain_index(counts),
+            "min_services": min(counts),
+            "max_services": max(counts),
+            "max_wait_ns": max(waits) if waits else None,
+            "starvation": starvation_events(order, n),
+            }
+
+
+class Topology(object):
+    """Producers and consumers connected by a single channel"""
+
+    def __init__(self, producers, consumers, messages, channel):
+        self.channel = channel
+        self.messages = messages
+        self.transferred = 0
+        self.producer_order = []
+        self.consumer_order = []
+        self.producer_waits = []
+        self.consumer_waits = []
+        self.tasklets = [stackless.tasklet(self.producer)(i) for i in xrange(producers)]
+        self.tasklets.extend(stackless.tasklet(self.consumer)(i) for i in xrange(consumers))
+        self.producers = producers
+        self.consumers = consumers
+
+    def producer(self, index):
+        send = self.channel.send
+        append = self.producer_waits.append
+        while self.transferred < self.messages:
+            for i in xrange(WORK):  # @UnusedVariable
+                pass
+            t0 = clock_ns()
+            send(index)
+            append(clock_ns() - t0)
+
+    def consumer(self, index):
+        receive = self.channel.receive
+        append = self.consumer_waits.append
+        while self.transferred < self.messages:
+            t0 = clock_ns()
+            producer = receive()
+            append(clock_ns() - t0)
+            self.transferred += 1
+            self.producer_order.append(producer)
+            self.consumer_order.append(index)
+            for i in xrange(WORK):  # @UnusedVariable
+                pass
+
+    def run(self, timeslice):
+        if not timeslice:
+            stackless.run()
+            return
+        while stackless.runcount > 1:
+            t = stackless.run(timeslice, soft=True, totaltimeout=True, ignore_nesting=True)
+            if t:
+                t.insert()
+
+    def kill(self):
+        for t in self.tasklets:
+            t.kill()
+
+    def metrics(self):
+        result = {}
+        for prefix, order, n, waits in (("producer_", self.producer_order, self.producers, self.producer_waits),
+                                        ("consumer_", self.consumer_order, self.consumers, self.consumer_waits)):
+            for k, v in analyze(order, n, waits).items():
+                result[prefix + k] = v
+        return result
+
+
+def fairness(loops, topology, preference, schedule_all, timeslice):
+    """Transfer *loops* messages and analyze the order of the services"""
+    producers, consumers = TOPOLOGIES[topology]
+    t = Topology(producers, consumers, loops, make_channel(preference, schedule_all))
+    try:
+        t0 = clock()
+        t.run(timeslice)
+        elapsed = clock() - t0
+    finally:
+        t.kill()
+    return elapsed, t.metrics()
+
+
+def _fairness_params():
+    params = dict(CHANNEL_PARAMS)
+    params["topology"] = sorted(TOPOLOGIES)
+    params["timeslice"] = (0, 1000)
+    return params
+
+BENCHMARKS = [
+    Benchmark("channel.fairness", fairness, 20000, unit="msg", params=_fairness_params()),
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main(BENCHMARKS, description=__doc__))
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Channel streaming benchmarks
+
+Stream a generator through a channel using channel.send_sequence() or
+per item channel.send() into a consumer, that iterates over the channel
+("for x in channel", see testSig_next) or calls channel.receive(). The
+drain benchmark measures how long it takes to empty a long queue of
+blocked senders with and without channel.close() (see TestClose).
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import sys
+import stackless
+from stackless_testsuite.bench import Benchmark, clock, main
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1.channel.bench  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1.channel.bench"  # @ReservedAssignment
+
+try:
+    xrange  # @UndefinedVariable
+except NameError:
+    xrange = range  # @ReservedAssignment
+
+QUEUE_LENGTHS = (100, 1000, 10000)
+
+
+def iter_consumer(channel, counter):
+    for x in channel:  # @UnusedVariable
+        counter[0] += 1
+
+
+def receive_consumer(channel, counter):
+    receive = channel.receive
+    while True:
+        receive()
+        counter[0] += 1
+
+
+CONSUMERS = {"iter": iter_consumer,
+             "receive": receive_consumer,
+             }
+
+
+def send_sequence_producer(channel, items):
+    channel.send_sequence(items)
+
+
+def send_producer(channel, items):
+    send = channel.send
+    for x in items:
+        send(x)
+
+
+PRODUCERS = {"send_sequence": send_sequence_producer,
+             "send": send_producer,
+             }
+
+
+def stream(loops, producer, consumer, preference):
+    """The main tasklet streams *loops* generated items to a consumer tasklet"""
+    c = stackless.channel()
+    c.preference = preference
+    counter = [0]
+    t = stackless.tasklet(CONSUMERS[consumer])(c, counter)
+    t.run()
+    items = (i for i in xrange(loops))
+    try:
+        t0 = clock()
+        PRODUCERS[producer](c, items)
+        # let the consumer process the last item
+        stackless.run()
+        elapsed = clock() - t0
+    finally:
+        c.close()
+        t.kill()
+    if counter[0] != loops:
+        raise RuntimeError("consumer got %d of %d items" % (counter[0], loops))
+    return elapsed
+
+
+def sender(channel, item):
+    channel.send(item)
+
+
+def drain(loops, queue, close):
+    """Empty a queue of *queue* blocked senders"""
+    elapsed = 0.0
+    for i in xrange(loops):  # @UnusedVariable
+        c = stackless.channel()
+        c.preference = -1  # the senders become runnable, but don't run
+        for j in xrange(queue):
+            stackless.tasklet(sender)(c, j)
+        stackless.run()
+        t0 = clock()
+        if close:
+            c.close()
+            for x in c:  # @UnusedVariable
+                pass
+        else:
+            receive = c.receive
+            for j in xrange(queue):  # @UnusedVariable
+                receive()
+        elapsed += clock() - t0
+        if c.balance != 0:
+            raise RuntimeError("balance is %d" % (c.balance,))
+        stackless.run()
+    return elapsed
+
+
+def _queue(params):
+    return params["queue"]
+
+BENCHMARKS = [
+    Benchmark("channel.stream", stream, 100000, unit="item",
+              params={"producer": sorted(PRODUCERS),
+                      "consumer": sorted(CONSUMERS),
+                      "preference": (-1, 1)}),
+    Benchmark("channel.drain", drain, 10, unit="item", ops_per_loop=_queue,
+              params={"queue": QUEUE_LENGTHS,
+                      "close": (False, True)}),
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main(BENCHMARKS, description=__doc__))
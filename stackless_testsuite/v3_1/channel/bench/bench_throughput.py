@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Channel throughput benchmarks
+
+Measure messages per second for the communication patterns of
+test_channel.py with every combination of the channel attributes
+"preference" and "schedule_all".
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import sys
+import stackless
+from stackless_testsuite.bench import Benchmark, CONTEXTS, clock, main
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1.channel.bench  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1.channel.bench"  # @ReservedAssignment
+
+try:
+    xrange  # @UndefinedVariable
+except NameError:
+    xrange = range  # @ReservedAssignment
+
+CHANNEL_PARAMS = {"preference": (-1, 0, 1),
+                  "schedule_all": (0, 1),
+                  }
+
+
+def make_channel(preference, schedule_all):
+    c = stackless.channel()
+    c.preference = preference
+    c.schedule_all = schedule_all
+    return c
+
+
+def ping_pong(loops, preference, schedule_all):
+    """The main tasklet and an echo tasklet exchange *loops* round trips"""
+    ping = make_channel(preference, schedule_all)
+    pong = make_channel(preference, schedule_all)
+
+    def echo():
+        receive = ping.receive
+        send = pong.send
+        for i in xrange(loops):  # @UnusedVariable
+            send(receive())
+
+    stackless.tasklet(echo)()
+    send = ping.send
+    receive = pong.receive
+    t0 = clock()
+    for i in xrange(loops):
+        send(i)
+        receive()
+    return clock() - t0
+
+
+def fan_in(loops, preference, schedule_all, tasklets):
+    """*tasklets* senders, the main tasklet receives *loops* messages"""
+    c = make_channel(preference, schedule_all)
+    # exactly *loops* messages, the first senders send one more
+    per_tasklet, extra = divmod(loops, tasklets)
+
+    def sender(n):
+        send = c.send
+        for i in xrange(n):
+            send(i)
+
+    for i in xrange(tasklets):
+        stackless.tasklet(sender)(per_tasklet + (i < extra))
+    receive = c.receive
+    t0 = clock()
+    for i in xrange(loops):  # @UnusedVariable
+        receive()
+    return clock() - t0
+
+
+def fan_out(loops, preference, schedule_all, tasklets):
+    """The main tasklet sends *loops* messages, *tasklets* receivers"""
+    c = make_channel(preference, schedule_all)
+    # exactly *loops* messages, the first receivers receive one more
+    per_tasklet, extra = divmod(loops, tasklets)
+
+    def receiver(n):
+        receive = c.receive
+        for i in xrange(n):  # @UnusedVariable
+            receive()
+
+    for i in xrange(tasklets):
+        stackless.tasklet(receiver)(per_tasklet + (i < extra))
+    send = c.send
+    t0 = clock()
+    for i in xrange(loops):
+        send(i)
+    return clock() - t0
+
+
+def send_sequence(loops, preference, schedule_all):
+    """A tasklet transfers *loops* items using channel.send_sequence()"""
+    c = make_channel(preference, schedule_all)
+
+    def sender():
+        c.send_sequence(xrange(loops))
+
+    stackless.tasklet(sender)()
+    receive = c.receive
+    t0 = clock()
+    for i in xrange(loops):  # @UnusedVariable
+        receive()
+    return clock() - t0
+
+
+def _fan_params():
+    params = dict(CHANNEL_PARAMS)
+    params["tasklets"] = (2, 16)
+    return params
+
+BENCHMARKS = [
+    Benchmark("channel.ping_pong", ping_pong, 100000, unit="msg", ops_per_loop=2,
+              params=CHANNEL_PARAMS, contexts=CONTEXTS),
+    Benchmark("channel.fan_in", fan_in, 200000, unit="msg", params=_fan_params(), contexts=CONTEXTS),
+    Benchmark("channel.fan_out", fan_out, 200000, unit="msg", params=_fan_params(), contexts=CONTEXTS),
+    Benchmark("channel.send_sequence", send_sequence, 200000, unit="msg",
+              params=CHANNEL_PARAMS, contexts=CONTEXTS),
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main(BENCHMARKS, description=__doc__))
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Tasklet life cycle benchmarks
+
+Measure the cost of the state transitions tested in
+tasklet/test_functionality.py (see stackless/tasklets.html#tasklet-life-cycle)
+and the memory used per tasklet.
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import gc
+import sys
+import stackless
+from stackless_testsuite.bench import Benchmark, clock, rss, main
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1.tasklet.bench  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1.tasklet.bench"  # @ReservedAssignment
+
+try:
+    xrange
+except NameError:
+    xrange = range  # @ReservedAssignment
+
+SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+
+
+def nop(*args, **kw):
+    pass
+
+
+def wait(channel):
+    channel.receive()
+
+
+#
+# Create tasklets in the states of the life cycle
+#
+def make_notalive(n):
+    tasklet = stackless.tasklet
+    return [tasklet() for i in xrange(n)]
+
+
+def make_bound(n):
+    tasklet = stackless.tasklet
+    return [tasklet(nop) for i in xrange(n)]
+
+
+def make_scheduled(n):
+    tasklet = stackless.tasklet
+    return [tasklet(nop)() for i in xrange(n)]
+
+
+def make_paused(n):
+    tasklet = stackless.tasklet
+    return [tasklet().bind(nop, ()) for i in xrange(n)]
+
+
+def make_blocked(n):
+    tasklet = stackless.tasklet
+    c = stackless.channel()
+    tlets = [tasklet(wait)(c) for i in xrange(n)]
+    stackless.run()
+    return tlets
+
+
+def kill_all(tlets):
+    for t in tlets:
+        t.kill()
+
+
+#
+# Timed state transitions
+#
+def create(loops, tasklets):
+    """-> notalive"""
+    elapsed = 0.0
+    tasklet = stackless.tasklet
+    for i in xrange(loops):
+        t0 = clock()
+        tlets = [tasklet() for j in xrange(tasklets)]
+        elapsed += clock() - t0
+        del tlets
+    return elapsed
+
+
+def bind(loops, tasklets):
+    """notalive -> bound"""
+    elapsed = 0.0
+    for i in xrange(loops):
+        tlets = make_notalive(tasklets)
+        t0 = clock()
+        for t in tlets:
+            t.bind(nop)
+        elapsed += clock() - t0
+    return elapsed
+
+
+def setup(loops, tasklets):
+    """bound -> scheduled"""
+    elapsed = 0.0
+    for i in xrange(loops):
+        tlets = make_bound(tasklets)
+        t0 = clock()
+        for t in tlets:
+            t.setup()
+        elapsed += clock() - t0
+        kill_all(tlets)
+    return elapsed
+
+
+def remove(loops, tasklets):
+    """scheduled -> paused"""
+    elapsed = 0.0
+    for i in xrange(loops):
+        tlets = make_scheduled(tasklets)
+        t0 = clock()
+        for t in tlets:
+            t.remove()
+        elapsed += clock() - t0
+        kill_all(tlets)
+    return elapsed
+
+
+def insert(loops, tasklets):
+    """paused -> scheduled"""
+    elapsed = 0.0
+    for i in xrange(loops):
+        tlets = make_paused(tasklets)
+        t0 = clock()
+        for t in tlets:
+            t.insert()
+        elapsed += clock() - t0
+        kill_all(tlets)
+    return elapsed
+
+
+def run(loops, tasklets):
+    """paused -> current -> notalive"""
+    elapsed = 0.0
+    for i in xrange(loops):
+        tlets = make_paused(tasklets)
+        t0 = clock()
+        for t in tlets:
+            t.run()
+        elapsed += clock() - t0
+    return elapsed
+
+
+def run_scheduler(loops, tasklets):
+    """scheduled -> current -> notalive, using stackless.run()"""
+    elapsed = 0.0
+    for i in xrange(loops):
+        tlets = make_scheduled(tasklets)  # @UnusedVariable
+        t0 = clock()
+        stackless.run()
+        elapsed += clock() - t0
+    return elapsed
+
+
+def kill(loops, tasklets):
+    """scheduled -> notalive"""
+    elapsed = 0.0
+    for i in xrange(loops):
+        tlets = make_scheduled(tasklets)
+        t0 = clock()
+        for t in tlets:
+            t.kill()
+        elapsed += clock() - t0
+    return elapsed
+
+
+def kill_blocked(loops, tasklets):
+    """blocked -> notalive, the tasklets have a frame"""
+    elapsed = 0.0
+    for i in xrange(loops):
+        tlets = make_blocked(tasklets)
+        t0 = clock()
+        for t in tlets:
+            t.kill()
+        elapsed += clock() - t0
+    return elapsed
+
+
+def dealloc(loops, tasklets):
+    """Release finished tasklets"""
+    elapsed = 0.0
+    for i in xrange(loops):
+        tlets = make_scheduled(tasklets)
+        stackless.run()
+        t0 = clock()
+        del tlets[:]
+        elapsed += clock() - t0
+    return elapsed
+
+
+#
+# Memory accounting
+#
+MAKE = {"bound": make_bound,
+        "scheduled": make_scheduled,
+        "paused": make_paused,
+        "blocked": make_blocked,
+        }
+
+
+def memory(loops, tasklets, state):
+    """Memory per tasklet in the given state
+
+    The metrics are bytes per tasklet: "rss" is the growth of the resident set
+    size from before the first batch to the point, where the tasklets of the
+    first batch are alive. Later batches reuse the freed memory and are not
+    included. Memory freed by earlier runs gets reused too, run with
+    ``--warmup 0`` to measure a fresh process. "traced" is the growth of the
+    memory traced by tracemalloc and "retained" the traced memory, that is
+    still allocated after the tasklets have been killed and released.
+    """
+    make = MAKE[state]
+    elapsed = 0.0
+    rss_growth = traced = retained = None
+    gc.collect()
+    rss_before = rss()
+    for i in xrange(loops):
+        if i:
+            gc.collect()
+        t0 = clock()
+        tlets = make(tasklets)
+        elapsed += clock() - t0
+        if i == 0:
+            rss_after = rss()
+            if rss_before is not None and rss_after is not None:
+                rss_growth = (rss_after - rss_before) / tasklets
+        kill_all(tlets)
+        del tlets
+
+    if tracemalloc is not None and not tracemalloc.is_tracing():
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            tlets = make(tasklets)
+            traced = (tracemalloc.get_traced_memory()[0] - before) / tasklets
+            kill_all(tlets)
+            del tlets
+            gc.collect()
+            retained = (tracemalloc.get_traced_memory()[0] - before) / tasklets
+        finally:
+            tracemalloc.stop()
+    return elapsed, {"rss": rss_growth, "traced": traced, "retained": retained}
+
+
+def _tasklets(params):
+    return params["tasklets"]
+
+SIZE_PARAMS = {"tasklets": SIZES}
+
+BENCHMARKS = [Benchmark("tasklet." + func.__name__, func, 1, unit="tasklet",
+                        ops_per_loop=_tasklets, params=SIZE_PARAMS)
+              for func in (create, bind, setup, remove, insert, run, run_scheduler, kill, kill_blocked, dealloc)]
+BENCHMARKS.append(Benchmark("tasklet.memory", memory, 1, unit="tasklet", ops_per_loop=_tasklets,
+                            params={"tasklets": SIZES, "state": sorted(MAKE)}))
+
+
+if __name__ == "__main__":
+    sys.exit(main(BENCHMARKS, description=__doc__))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Tasklet pickling benchmarks
+
+Pickle and unpickle a paused tasklet created by
+test_pickle.make_paused_tasklet() with a given number of recursion levels
+and a local list of a given size, and report the size of the pickle. The
+benchmark "pickle.resume" also runs the unpickled tasklet to its end and
+checks its result.
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import pickle
+import sys
+from stackless_testsuite.bench import Benchmark, BenchmarkSkipped, softswitch_enabled, clock, main
+from stackless_testsuite.v3_1.tasklet import test_pickle
+from stackless_testsuite.v3_1.tasklet.test_pickle import make_paused_tasklet
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1.tasklet.bench  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1.tasklet.bench"  # @ReservedAssignment
+
+try:
+    xrange
+except NameError:
+    xrange = range  # @ReservedAssignment
+
+
+def paused_tasklet(depth, size):
+    if not softswitch_enabled():
+        # hard switched frames are not restorable
+        raise BenchmarkSkipped("tasklet pickling requires soft-switching")
+    return make_paused_tasklet(depth, size)
+
+
+def pickled_tasklet(depth, size, protocol):
+    t = paused_tasklet(depth, size)
+    try:
+        return pickle.dumps(t, protocol)
+    finally:
+        t.kill()
+
+
+def dumps(loops, depth, size, protocol):
+    """Pickle the same paused tasklet *loops* times"""
+    t = paused_tasklet(depth, size)
+    try:
+        t0 = clock()
+        for i in xrange(loops):  # @UnusedVariable
+            data = pickle.dumps(t, protocol)
+        elapsed = clock() - t0
+    finally:
+        t.kill()
+    return elapsed, {"bytes": len(data)}
+
+
+def loads(loops, depth, size, protocol):
+    """Unpickle the same pickle *loops* times"""
+    data = pickled_tasklet(depth, size, protocol)
+    tlets = []
+    append = tlets.append
+    t0 = clock()
+    for i in xrange(loops):  # @UnusedVariable
+        append(pickle.loads(data))
+    elapsed = clock() - t0
+    for t in tlets:
+        t.kill()
+    return elapsed, {"bytes": len(data)}
+
+
+def resume(loops, depth, size, protocol):
+    """Unpickle a tasklet and run it to its end"""
+    data = pickled_tasklet(depth, size, protocol)
+    results = test_pickle.results
+    del results[:]
+    t0 = clock()
+    for i in xrange(loops):  # @UnusedVariable
+        pickle.loads(data).run()
+    elapsed = clock() - t0
+    if results != [size + depth] * loops:
+        raise AssertionError("unpickled tasklets returned wrong results: %r" % (sorted(set(results)),))
+    del results[:]
+    return elapsed, {"bytes": len(data)}
+
+
+PICKLE_PARAMS = {"depth": (0, 10, 100),
+                 "size": (0, 100, 10000),
+                 "protocol": tuple(range(pickle.HIGHEST_PROTOCOL + 1)),
+                 }
+
+BENCHMARKS = [
+    Benchmark("pickle.dumps", dumps, 1000, unit="tasklet", params=PICKLE_PARAMS),
+    Benchmark("pickle.loads", loads, 1000, unit="tasklet", params=PICKLE_PARAMS),
+    Benchmark("pickle.resume", resume, 1000, unit="tasklet", params=PICKLE_PARAMS),
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main(BENCHMARKS, description=__doc__))
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Cross thread scheduling benchmarks
+
+Measure the latency from inserting (or binding) a tasklet into the run
+queue of another thread until it runs there, and the latency of channel
+communication between threads as in testInterthreadCommunication.
+
+The remote thread either polls its run queue like
+test_thread.SchedulingThread (wakeup "poll") or sleeps until the
+benchmark wakes it up (wakeup "event").
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import sys
+import threading
+import stackless
+from stackless_testsuite.bench import Benchmark, BenchmarkSkipped, clock, clock_ns, percentile, main
+from stackless_testsuite.v3_1.tasklet.test_thread import LingeringThread, SchedulingThread
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1.tasklet.bench  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1.tasklet.bench"  # @ReservedAssignment
+
+try:
+    xrange
+except NameError:
+    xrange = range  # @ReservedAssignment
+
+
+class EventSchedulingThread(LingeringThread):
+    """ A thread that runs its scheduler whenever it gets woken up"""
+
+    def __init__(self, *args, **kwargs):
+        super(EventSchedulingThread, self).__init__(*args, **kwargs)
+        self.wakeup = threading.Event()
+
+    def wake(self):
+        self.wakeup.set()
+
+    def linger(self):
+        while not self.shutdown.is_set():
+            self.wakeup.wait()
+            self.wakeup.clear()
+            stackless.run()
+
+    def join(self):
+        self.shutdown.set()
+        self.wakeup.set()
+        return super(EventSchedulingThread, self).join()
+
+
+THREAD_CLASSES = {"poll": SchedulingThread,
+                  "event": EventSchedulingThread,
+                  }
+
+
+class Probe(object):
+    """Records the time from the last stamp until a tasklet runs"""
+
+    def __init__(self, expected=1):
+        self.stamp = 0
+        self.samples = []
+        self.expected = expected
+        self.done = threading.Event()
+
+    def __call__(self):
+        self.samples.append(clock_ns() - self.stamp)
+        if len(self.samples) >= self.expected:
+            self.done.set()
+
+    def wait(self, expected):
+        self.done.wait()
+        self.done.clear()
+        self.expected = expected
+
+    def metrics(self):
+        samples = sorted(self.samples)
+        return {"p50_ns": percentile(samples, 50),
+                "p99_ns": percentile(samples, 99),
+                "max_ns": samples[-1] if samples else None,
+                }
+
+
+def start_thread(wakeup, probe, n):
+    """Start a scheduling thread, that owns *n* paused tasklets running *probe*"""
+    created = []
+    ready = threading.Event()
+
+    def create():
+        for i in xrange(n):  # @UnusedVariable
+            created.append(stackless.tasklet(probe)().remove())
+        ready.set()
+
+    thread = THREAD_CLASSES[wakeup](target=create)
+    thread.start()
+    ready.wait()
+    return thread, created
+
+
+def _wake(thread):
+    wake = getattr(thread, "wake", None)
+    if wake is not None:
+        wake()
+
+
+def insert(loops, wakeup):
+    """Insert a remote tasklet and wait until it ran"""
+    probe = Probe()
+    thread, tlets = start_thread(wakeup, probe, loops)
+    try:
+        t0 = clock()
+        for i, t in enumerate(tlets):
+            probe.stamp = clock_ns()
+            t.insert()
+            _wake(thread)
+            probe.wait(i + 2)
+        elapsed = clock() - t0
+    finally:
+        thread.join()
+    return elapsed, probe.metrics()
+
+
+def insert_batch(loops, wakeup):
+    """Insert all remote tasklets, then wait until the last one ran"""
+    probe = Probe(loops)
+    thread, tlets = start_thread(wakeup, probe, loops)
+    try:
+        t0 = clock()
+        probe.stamp = clock_ns()
+        for t in tlets:
+            t.insert()
+        _wake(thread)
+        probe.wait(0)
+        elapsed = clock() - t0
+    finally:
+        thread.join()
+    return elapsed, probe.metrics()
+
+
+def bind_thread(loops, wakeup):
+    """Bind a local tasklet to the remote thread, insert it and wait until it ran"""
+    probe = Probe()
+    thread, tlets = start_thread(wakeup, probe, 0)  # @UnusedVariable
+    try:
+        tlets = [stackless.tasklet().bind(probe, ()) for i in xrange(loops)]
+        t0 = clock()
+        for i, t in enumerate(tlets):
+            probe.stamp = clock_ns()
+            try:
+                t.bind_thread(thread.ident)
+            except RuntimeError as e:
+                raise BenchmarkSkipped(str(e))
+            t.insert()
+            _wake(thread)
+            probe.wait(i + 2)
+        elapsed = clock() - t0
+    finally:
+        thread.join()
+    return elapsed, probe.metrics()
+
+
+def channel(loops):
+    """Round trips between the main tasklets of two threads"""
+    ping = stackless.channel()
+    pong = stackless.channel()
+
+    def echo():
+        receive = ping.receive
+        send = pong.send
+        for i in xrange(loops):  # @UnusedVariable
+            send(receive())
+
+    thread = threading.Thread(target=echo)
+    thread.start()
+    samples = []
+    try:
+        t0 = clock()
+        for i in xrange(loops):
+            stamp = clock_ns()
+            ping.send(i)
+            pong.receive()
+            samples.append(clock_ns() - stamp)
+        elapsed = clock() - t0
+    finally:
+        thread.join()
+    samples.sort()
+    return elapsed, {"round_trip_p50_ns": percentile(samples, 50),
+                     "round_trip_p99_ns": percentile(samples, 99),
+                     }
+
+
+WAKEUP_PARAMS = {"wakeup": sorted(THREAD_CLASSES)}
+
+BENCHMARKS = [
+    Benchmark("thread.insert", insert, 1000, unit="tasklet", params=WAKEUP_PARAMS),
+    Benchmark("thread.insert_batch", insert_batch, 10000, unit="tasklet", params=WAKEUP_PARAMS),
+    Benchmark("thread.bind_thread", bind_thread, 1000, unit="tasklet", params=WAKEUP_PARAMS),
+    Benchmark("thread.channel", channel, 10000, unit="msg", ops_per_loop=2),
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main(BENCHMARKS, description=__doc__))
@@ -0,0 +1,457 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Property based scheduler fuzzer
+
+The fuzzer generates random sequences of operations on a few tasklets and
+channels. The main tasklet creates, binds, sets up, inserts, removes, runs,
+switches to and kills tasklets, calls stackless.schedule() and
+stackless.run() and sends or receives, if this doesn't block. It also
+orders the tasklets to send, receive, schedule, remove themselves or end,
+when they run the next time.
+
+A model tracks the expected state of every tasklet. After every step the
+fuzzer checks the tasklet flags using the assert_state_* helpers of
+TaskletTest, the length of the run queue, the balance and the queue of
+every channel and that every received value was sent once. A failing
+sequence gets shrunk to a short sequence, that still fails.
+
+Usage::
+   $ python -m stackless_testsuite.v3_1.tasklet.fuzz --seed 1 --time 3600
+   $ python -m stackless_testsuite.v3_1.tasklet.fuzz --replay '[["create", 0], ...]'
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import argparse
+import json
+import random
+import sys
+import time
+import traceback
+
+import stackless
+from stackless_testsuite.util import kill_scheduled_tasklets
+from stackless_testsuite.v3_1.tasklet.test_functionality import TaskletTest
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1.tasklet  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1.tasklet"  # @ReservedAssignment
+
+TASKLETS = 4
+CHANNELS = 2
+STEPS = 30
+
+# maximal number of pending orders of a tasklet
+MAX_ORDERS = 3
+
+# the expected state of a tasklet, while the main tasklet is current
+EMPTY = "empty"  # no tasklet yet
+NOTALIVE = "notalive"
+BOUND = "bound"
+PAUSED = "paused"
+SCHEDULED = "scheduled"
+CHANNEL = "channel"  # in a channel operation: blocked or unblocked, but not yet resumed
+CURRENT = "current"
+
+
+class Slot(object):
+    """A tasklet and its expected state"""
+
+    def __init__(self):
+        self.tasklet = None
+        self.state = EMPTY
+        self.started = False
+        self.orders = []
+        # the pending channel operation
+        self.channel = None
+        self.direction = 0
+
+
+def agent(fuzzer, index):
+    """The function of all tasklets: execute the orders of the slot"""
+    slot = fuzzer.slots[index]
+    slot.started = True
+    while True:
+        slot.state = CURRENT
+        order = slot.orders.pop(0) if slot.orders else ("remove",)
+        if order[0] == "remove":
+            slot.state = PAUSED
+            stackless.schedule_remove()
+        elif order[0] == "schedule":
+            slot.state = SCHEDULED
+            stackless.schedule()
+        elif order[0] == "end":
+            slot.state = NOTALIVE
+            return
+        else:
+            fuzzer.channel_op(slot, order[0], order[1])
+
+
+ORDERS = [("remove",), ("schedule",), ("end",)]
+
+
+class Fuzzer(object):
+    """Generate, execute and shrink sequences of operations"""
+
+    def __init__(self, tasklets=TASKLETS, channels=CHANNELS):
+        self.tasklets = tasklets
+        self.channels_count = channels
+        self.checker = TaskletTest("check_tasklet_flags")
+        self.orders = ORDERS + [(op, i) for op in ("send", "receive") for i in range(channels)]
+        self.reset()
+
+    def reset(self):
+        kill_scheduled_tasklets()
+        self.slots = [Slot() for i in range(self.tasklets)]
+        self.channels = [stackless.channel() for i in range(self.channels_count)]
+        self.offered = [set() for c in self.channels]
+        self.delivered = [set() for c in self.channels]
+        self.value = 0
+        try:
+            softswitch = stackless.enable_softswitch(None)
+        except AttributeError:
+            softswitch = False
+        # hard switched tasklets aren't restorable
+        self.restorable = True if softswitch else "ignore"
+
+    def cleanup(self):
+        for slot in self.slots:
+            if slot.tasklet is not None and slot.tasklet.alive:
+                slot.tasklet.kill()
+        kill_scheduled_tasklets()
+
+    #
+    # Channel operations of the main tasklet and of the agents
+    #
+    def send(self, index):
+        self.value += 1
+        self.offered[index].add(self.value)
+        self.channels[index].send(self.value)
+
+    def receive(self, index):
+        value = self.channels[index].receive()
+        self.checker.assertIn(value, self.offered[index], "received a value, that was not sent")
+        self.checker.assertNotIn(value, self.delivered[index], "received a value twice")
+        self.delivered[index].add(value)
+
+    def channel_op(self, slot, op, index):
+        slot.state = CHANNEL
+        slot.channel = index
+        if op == "send":
+            slot.direction = 1
+            self.send(index)
+        else:
+            slot.direction = -1
+            self.receive(index)
+        slot.channel = None
+        slot.direction = 0
+
+    #
+    # Operations
+    #
+    def applicable(self, op):
+        """Return True, if the model allows *op* in the current state"""
+        name = op[0]
+        if name in ("schedule", "run_all"):
+            return True
+        if name in ("send", "receive", "preference"):
+            if not 0 <= op[1] < len(self.channels):
+                return False
+            balance = self.channels[op[1]].balance
+            # the main tasklet must not block
+            return name == "preference" or (balance < 0 if name == "send" else balance > 0)
+        if not 0 <= op[1] < len(self.slots):
+            return False
+        slot = self.slots[op[1]]
+        state = slot.state
+        if name == "create":
+            return state in (EMPTY, NOTALIVE)
+        if name == "bind":
+            return state == NOTALIVE
+        if name == "bind_args":
+            return state in (NOTALIVE, BOUND)
+        if name == "unbind":
+            return state == BOUND or (state == PAUSED and not slot.started)
+        if name == "setup":
+            return state == BOUND
+        if name == "insert":
+            return state == PAUSED
+        if name == "remove":
+            return state == SCHEDULED
+        if name in ("run", "switch"):
+            return state in (PAUSED, SCHEDULED)
+        if name == "kill":
+            return state in (PAUSED, SCHEDULED, CHANNEL)
+        if name == "order":
+            return state not in (EMPTY, NOTALIVE) and len(slot.orders) < MAX_ORDERS
+        raise ValueError("Unknown operation %r" % (op,))
+
+    def candidates(self):
+        """Return all operations applicable in the current state"""
+        ops = [("schedule",), ("run_all",)]
+        for i in range(len(self.channels)):
+            ops.extend([("send", i), ("receive", i), ("preference", i, -1), ("preference", i, 0),
+                        ("preference", i, 1)])
+        for i in range(len(self.slots)):
+            ops.extend((name, i) for name in ("create", "bind", "bind_args", "unbind", "setup", "insert",
+                                              "remove", "run", "switch", "kill"))
+            ops.extend(("order", i, order) for order in self.orders)
+        return [op for op in ops if self.applicable(op)]
+
+    def execute(self, op):
+        name = op[0]
+        if name == "schedule":
+            stackless.schedule()
+        elif name == "run_all":
+            stackless.run()
+        elif name == "send":
+            self.send(op[1])
+        elif name == "receive":
+            self.receive(op[1])
+        elif name == "preference":
+            self.channels[op[1]].preference = op[2]
+        else:
+            slot = self.slots[op[1]]
+            if name == "create":
+                slot.tasklet = stackless.tasklet()
+                slot.state = NOTALIVE
+                slot.started = False
+                del slot.orders[:]
+            elif name == "bind":
+                slot.tasklet.bind(agent)
+                slot.state = BOUND
+                slot.started = False
+                del slot.orders[:]
+            elif name == "bind_args":
+                slot.tasklet.bind(agent, (self, op[1]))
+                slot.state = PAUSED
+                slot.started = False
+                del slot.orders[:]
+            elif name == "unbind":
+                slot.tasklet.bind(None)
+                slot.state = NOTALIVE
+            elif name == "setup":
+                slot.tasklet.setup(self, op[1])
+                slot.state = SCHEDULED
+            elif name == "insert":
+                slot.tasklet.insert()
+                slot.state = SCHEDULED
+            elif name == "remove":
+                slot.tasklet.remove()
+                slot.state = PAUSED
+            elif name == "run":
+                slot.tasklet.run()
+            elif name == "switch":
+                slot.tasklet.switch()
+            elif name == "kill":
+                slot.tasklet.kill()
+                slot.state = NOTALIVE
+            elif name == "order":
+                slot.orders.append(tuple(op[2]))
+
+    #
+    # Invariants
+    #
+    def check(self):
+        checker = self.checker
+        checker.assertIs(stackless.current, stackless.main)
+        checker.check_tasklet_flags(stackless.main, alive=True, scheduled=True, is_current=True, is_main=True,
+                                    restorable="ignore")
+        runnable = 1
+        for i, slot in enumerate(self.slots):
+            t = slot.tasklet
+            kw = {"tempval": "ignore", "restorable": self.restorable} if slot.started else {}
+            if slot.state == EMPTY:
+                continue
+            elif slot.state == NOTALIVE:
+                checker.assert_state_notalive(t)
+            elif slot.state == BOUND:
+                checker.assert_state_bound(t, agent)
+            elif slot.state == PAUSED:
+                checker.assert_state_paused(t, **kw)
+            elif slot.state == SCHEDULED:
+                checker.assert_state_scheduled(t, **kw)
+                runnable += 1
+            elif slot.state == CHANNEL:
+                if t.blocked:
+                    checker.assert_state_blocked(t, **kw)
+                else:
+                    # unblocked, but not yet resumed
+                    checker.assert_state_scheduled(t, **kw)
+                    runnable += 1
+            else:
+                checker.fail("tasklet %d is %s, but the main tasklet is current" % (i, slot.state))
+        checker.assertEqual(stackless.getruncount(), runnable, "unexpected length of the run queue")
+        for i, c in enumerate(self.channels):
+            blocked = [s for s in self.slots if s.state == CHANNEL and s.channel == i and s.tasklet.blocked]
+            checker.assertEqual(c.balance, sum(s.direction for s in blocked), "unexpected balance of channel %d" % (i,))
+            queue = []
+            t = c.queue
+            while t is not None and len(queue) <= len(blocked):
+                queue.append(t)
+                t = t.next
+                if t is c.queue:
+                    break
+            checker.assertEqual(len(queue), len(blocked), "unexpected queue length of channel %d" % (i,))
+            for s in blocked:
+                checker.assertIn(s.tasklet, queue, "blocked tasklet not in the queue of channel %d" % (i,))
+
+    #
+    # Generation and shrinking
+    #
+    def generate(self, rng, steps=STEPS):
+        """Execute *steps* random operations
+
+        Return the executed operations and the exception or None.
+        """
+        ops = []
+        self.reset()
+        try:
+            for i in range(steps):  # @UnusedVariable
+                op = rng.choice(self.candidates())
+                ops.append(op)
+                self.execute(op)
+                self.check()
+        except Exception as e:
+            return ops, e
+        finally:
+            self.cleanup()
+        return ops, None
+
+    def replay(self, ops):
+        """Execute *ops*, skipping those not applicable. Return the exception or None"""
+        self.reset()
+        try:
+            for op in ops:
+                if self.applicable(op):
+                    self.execute(op)
+                    self.check()
+        except Exception as e:
+            return e
+        finally:
+            self.cleanup()
+        return None
+
+    def fails(self, ops, kind):
+        return isinstance(self.replay(ops), kind)
+
+    def shrink(self, ops, kind):
+        """Remove operations from *ops*, as long as the replay raises *kind*"""
+        chunk = len(ops) // 2
+        while chunk >= 1:
+            i = 0
+            while i < len(ops):
+                candidate = ops[:i] + ops[i + chunk:]
+                if self.fails(candidate, kind):
+                    ops = candidate
+                else:
+                    i += chunk
+            chunk //= 2
+        return ops
+
+
+class Failure(object):
+    """A failing case"""
+
+    def __init__(self, seed, case, ops, shrunk, error):
+        self.seed = seed
+        self.case = case
+        self.ops = ops
+        self.shrunk = shrunk
+        self.error = error
+
+    def report(self):
+        return ("seed %s case %d failed after %d operations, shrunk to %d:\n%s\n%s" %
+                (self.seed, self.case, len(self.ops), len(self.shrunk), json.dumps(self.shrunk),
+                 self.error))
+
+
+def case_rng(seed, case):
+    return random.Random(seed * 1000003 + case)
+
+
+def fuzz(seed, cases=None, duration=None, steps=STEPS, fuzzer=None):
+    """Run random cases until one fails, *cases* cases ran or *duration* seconds elapsed
+
+    Return the Failure or None and the number of cases.
+    """
+    if fuzzer is None:
+        fuzzer = Fuzzer()
+    start = time.time()
+    case = 0
+    while (cases is None or case < cases) and (duration is None or time.time() - start < duration):
+        ops, error = fuzzer.generate(case_rng(seed, case), steps)
+        if error is not None:
+            shrunk = fuzzer.shrink(ops, type(error))
+            error = fuzzer.replay(shrunk) or error
+            return Failure(seed, case, ops, shrunk, "".join(traceback.format_exception_only(type(error), error))), case
+        case += 1
+    return None, case
+
+
+def from_json(ops):
+    return [tuple(tuple(a) if isinstance(a, list) else a for a in op) for op in ops]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fuzz the tasklet state machine")
+    parser.add_argument("--seed", type=int, default=None, help="random seed (default: the time)")
+    parser.add_argument("-n", "--cases", type=int, default=None, help="number of cases")
+    parser.add_argument("--time", type=float, default=None, metavar="SECONDS",
+                        help="run for SECONDS (default: 10, if --cases is not given)")
+    parser.add_argument("--steps", type=int, default=STEPS, help="operations per case (default: %(default)s)")
+    parser.add_argument("--replay", default=None, metavar="JSON",
+                        help="replay a sequence of operations given as JSON list and print the error")
+    args = parser.parse_args(argv)
+
+    fuzzer = Fuzzer()
+    if args.replay:
+        ops = from_json(json.loads(args.replay))
+        fuzzer.reset()
+        try:
+            for op in ops:
+                if fuzzer.applicable(op):
+                    print(json.dumps(op))
+                    fuzzer.execute(op)
+                    fuzzer.check()
+                else:
+                    print("%s (skipped)" % (json.dumps(op),))
+        except Exception:
+            traceback.print_exc()
+            return 1
+        finally:
+            fuzzer.cleanup()
+        print("no error")
+        return 0
+
+    seed = args.seed if args.seed is not None else int(time.time())
+    duration = args.time if args.time is not None or args.cases is not None else 10.0
+    start = time.time()
+    failure, cases = fuzz(seed, args.cases, duration, args.steps, fuzzer)
+    elapsed = time.time() - start
+    print("seed %d: %d cases in %.1f s (%.0f cases/s)" % (seed, cases, elapsed, cases / elapsed if elapsed else 0))
+    if failure is not None:
+        print(failure.report())
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from __future__ import absolute_import, print_function, division
+
+from stackless_testsuite.util import StacklessTestCase
+from stackless_testsuite.v3_1.tasklet.fuzz import Fuzzer, fuzz
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1.tasklet  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1.tasklet"  # @ReservedAssignment
+
+SEED = 20160101
+
+
+class BalanceFuzzer(Fuzzer):
+    """A fuzzer with a wrong invariant: no channel has two blocked tasklets"""
+
+    def check(self):
+        super(BalanceFuzzer, self).check()
+        for c in self.channels:
+            self.checker.assertLess(abs(c.balance), 2)
+
+
+class TestFuzzer(StacklessTestCase):
+
+    def test_fuzz(self):
+        failure, cases = fuzz(SEED, cases=200)
+        if failure is not None:
+            self.fail(failure.report())
+        self.assertEqual(cases, 200)
+
+    def test_shrink(self):
+        fuzzer = BalanceFuzzer()
+        failure, cases = fuzz(SEED, cases=5000, steps=60, fuzzer=fuzzer)  # @UnusedVariable
+        self.assertIsNotNone(failure, "the fuzzer didn't find two blocked tasklets")
+        self.assertLessEqual(len(failure.shrunk), len(failure.ops))
+        self.assertTrue(fuzzer.fails(failure.shrunk, AssertionError))
+        # no single operation can be removed
+        for i in range(len(failure.shrunk)):
+            self.assertFalse(fuzzer.fails(failure.shrunk[:i] + failure.shrunk[i + 1:], AssertionError))
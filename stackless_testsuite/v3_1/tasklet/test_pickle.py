@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from __future__ import absolute_import, print_function, division
+
+import pickle
+import stackless
+from stackless_testsuite.util import StacklessTestCase
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1.tasklet  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1.tasklet"  # @ReservedAssignment
+
+DEPTHS = (0, 1, 10, 100)
+SIZES = (0, 10, 1000)
+PROTOCOLS = tuple(range(pickle.HIGHEST_PROTOCOL + 1))
+
+# the return values of resumed tasklets
+results = []
+
+
+def recurse_then_pause(depth, payload):
+    if depth:
+        return recurse_then_pause(depth - 1, payload) + 1
+    stackless.schedule_remove()
+    return len(payload)
+
+
+def pickle_me(depth, size):
+    payload = list(range(size))
+    results.append(recurse_then_pause(depth, payload))
+
+
+def make_paused_tasklet(depth, size):
+    """Return a paused tasklet with *depth* + 2 frames and a local list of *size* items"""
+    t = stackless.tasklet(pickle_me)(depth, size)
+    t.run()
+    return t
+
+
+class TestTaskletPickling(StacklessTestCase):
+    """Pickle half executed tasklets and resume them"""
+
+    def setUp(self):
+        super(TestTaskletPickling, self).setUp()
+        self.skipUnlessSoftswitching()
+        del results[:]
+
+    def check_resume(self, depth, size, protocol):
+        t = make_paused_tasklet(depth, size)
+        self.addCleanup(t.kill)
+        self.assertTrue(t.paused)
+        self.assertTrue(t.restorable)
+        data = pickle.dumps(t, protocol)
+        t.kill()
+
+        t2 = pickle.loads(data)
+        self.assertIsInstance(t2, stackless.tasklet)
+        self.assertTrue(t2.alive)
+        t2.run()
+        self.assertFalse(t2.alive)
+        self.assertListEqual(results, [size + depth])
+        del results[:]
+
+    def testResume(self):
+        for depth in DEPTHS:
+            for size in SIZES:
+                for protocol in PROTOCOLS:
+                    self.check_resume(depth, size, protocol)
+
+    def testResumeTwice(self):
+        t = make_paused_tasklet(3, 5)
+        self.addCleanup(t.kill)
+        data = pickle.dumps(t, pickle.HIGHEST_PROTOCOL)
+        t.kill()
+        for i in range(2):  # @UnusedVariable
+            t = pickle.loads(data)
+            t.run()
+        self.assertListEqual(results, [8, 8])
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+from __future__ import absolute_import, print_function, division
+
+import shutil
+import tempfile
+from stackless_testsuite import util
+from stackless_testsuite.util import StacklessTestCase, ApiCache
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1"  # @ReservedAssignment
+
+
+class IntContainer(object):
+    x = 1
+
+
+class StrContainer(object):
+    x = "1"
+
+
+def get_int_container(testcase):
+    return IntContainer
+
+
+def get_str_container(testcase):
+    return StrContainer
+
+
+class TestApiCache(StacklessTestCase):
+
+    def setUp(self):
+        super(TestApiCache, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_fingerprint_change(self):
+        cache = ApiCache(self.directory)
+        cache.add(cache.key(self, get_int_container, IntContainer, ("x",), "x", int))
+        # new interpreter processes with the same and with a changed API
+        same = ApiCache(self.directory)
+        same.passed = cache.passed
+        self.assertIn(same.key(self, get_int_container, IntContainer, ("x",), "x", int), same)
+        changed = ApiCache(self.directory)
+        changed.passed = cache.passed
+        self.assertNotIn(changed.key(self, get_int_container, StrContainer, ("x",), "x", int), changed)
+
+    def test_failure_not_added(self):
+        cache = ApiCache(self.directory)
+        old_cache = util.api_cache
+        util.api_cache = cache
+        try:
+            self.assertRaises(AssertionError, util._testAttributeTypeTemplate,
+                              self, get_str_container, "x", int, ("x",))
+            util._testAttributeTypeTemplate(self, get_int_container, "x", int, ("x",))
+        finally:
+            util.api_cache = old_cache
+        self.assertNotIn(cache.key(self, get_str_container, StrContainer, ("x",), "x", int), cache)
+        self.assertIn(cache.key(self, get_int_container, IntContainer, ("x",), "x", int), cache)
+        self.assertEqual(len(cache.passed), 1)
+
+    def test_save_merges(self):
+        first = ApiCache(self.directory)
+        first.add("first")
+        second = ApiCache(self.directory)
+        second.add("second")
+        first.save()
+        # the second process didn't see the key of the first one
+        second.save()
+        merged = ApiCache(self.directory)
+        self.assertIn("first", merged)
+        self.assertIn("second", merged)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from __future__ import absolute_import, print_function, division
+
+import stackless
+from stackless_testsuite.util import StacklessTestCase
+from stackless_testsuite.explore import explore, replay
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1"  # @ReservedAssignment
+
+
+def lost_update(run):
+    v = run.shared(x=0)
+
+    def increment():
+        x = v.x
+        stackless.schedule()
+        v.x = x + 1
+
+    run.spawn(increment)
+    run.spawn(increment)
+
+    def check():
+        assert v.x == 2, "lost update, x is %d" % (v.x,)
+    return check
+
+
+def independent(run):
+    """Three tasklets, each with its own variable"""
+    variables = [run.shared(x=0) for i in range(3)]
+
+    def worker(v):
+        for i in range(2):  # @UnusedVariable
+            v.x += 1
+            stackless.schedule()
+
+    for v in variables:
+        run.spawn(worker, v)
+
+    def check():
+        assert [v.x for v in variables] == [2, 2, 2]
+    return check
+
+
+def ping_pong(run):
+    ping = run.channel()
+    pong = run.channel()
+
+    def client():
+        for i in range(3):
+            ping.send(i)
+            assert pong.receive() == i
+
+    def echo():
+        for i in range(3):  # @UnusedVariable
+            pong.send(ping.receive())
+
+    run.spawn(client)
+    run.spawn(echo)
+
+
+def crossed_receive(run):
+    a = run.channel()
+    b = run.channel()
+
+    def first():
+        a.receive()
+        b.send(None)
+
+    def second():
+        b.receive()
+        a.send(None)
+
+    run.spawn(first)
+    run.spawn(second)
+
+
+class TestExplorer(StacklessTestCase):
+
+    def test_lost_update(self):
+        explorer = explore(lost_update)
+        self.assertEqual(len(explorer.failures), 1)
+        failure = explorer.failures[0]
+        self.assertEqual(failure.kind, "exception")
+        self.assertIn("lost update", failure.message)
+        # the schedule reproduces the failure
+        self.assertRaisesRegex(AssertionError, "lost update", replay, lost_update, failure.schedule)
+
+    def test_serial_schedule(self):
+        replay(lost_update, [0, 0, 1, 1])
+
+    def test_no_failure(self):
+        explorer = explore(ping_pong, stop_on_failure=False)
+        self.assertEqual(explorer.failures, [])
+        self.assertGreater(explorer.paths, 0)
+
+    def test_deadlock(self):
+        explorer = explore(crossed_receive)
+        self.assertEqual([f.kind for f in explorer.failures], ["deadlock"])
+
+    def test_reduction(self):
+        full = explore(independent, reduction=False, hashing=False)
+        reduced = explore(independent)
+        self.assertEqual(full.failures, [])
+        self.assertEqual(reduced.failures, [])
+        # independent steps: a single interleaving represents all
+        self.assertEqual(reduced.paths, 1)
+        self.assertGreater(full.paths, reduced.paths)
+
+    def test_preempt_step(self):
+        # without an interrupt, a step ends at stackless.schedule() as well
+        self.assertRaisesRegex(AssertionError, "lost update", replay, lost_update, [0, 1, 0, 1], preempt=100000)
+        replay(lost_update, [0, 0, 1, 1], preempt=100000)
+
+    def test_preempt(self):
+        explorer = explore(lost_update, preempt=100000)
+        self.assertEqual([f.kind for f in explorer.failures], ["exception"])
+        reduced = explore(independent, preempt=100000)
+        self.assertEqual(reduced.failures, [])
+        self.assertEqual(reduced.paths, 1)
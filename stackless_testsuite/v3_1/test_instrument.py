@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+from __future__ import absolute_import, print_function, division
+
+import os
+import shutil
+import tempfile
+import stackless
+from stackless_testsuite.util import StacklessTestCase
+from stackless_testsuite.instrument import SchedulerCounter, record, load, print_growth
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1"  # @ReservedAssignment
+
+
+class Stream(object):
+    def __init__(self):
+        self.parts = []
+
+    def write(self, s):
+        self.parts.append(s)
+
+
+class TestSchedulerCounter(StacklessTestCase):
+
+    def test_count(self):
+        counter = SchedulerCounter()
+        if not counter.install():
+            self.skipTest("the implementation lacks the schedule and channel callbacks")
+        try:
+            c = stackless.channel()
+            stackless.tasklet(c.send)(None)
+            # main blocks, the tasklet sends and ends
+            c.receive()
+            stackless.run()
+        finally:
+            counter.uninstall()
+        self.assertEqual(counter.started, 1)
+        self.assertEqual(counter.ended, 1)
+        self.assertEqual(counter.channel_ops, 2)
+        self.assertEqual(counter.channel_blocks, 1)
+        self.assertGreaterEqual(counter.switches, 2)
+
+    def test_uninstalled(self):
+        counter = SchedulerCounter()
+        counter.uninstall()
+        self.assertEqual(counter.as_dict(), {"switches": 0, "started": 0, "ended": 0,
+                                             "channel_ops": 0, "channel_blocks": 0})
+
+
+class TestRecord(StacklessTestCase):
+
+    def setUp(self):
+        super(TestRecord, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, switches):
+        path = os.path.join(self.directory, name)
+        counter = SchedulerCounter()
+        counter.switches = switches
+        record("test_a", counter, path)
+        return path
+
+    def test_load_later_wins(self):
+        self.write("counts.jsonl", 1)
+        path = self.write("counts.jsonl", 5)
+        counts = load(path)
+        self.assertEqual(list(counts), ["test_a"])
+        self.assertEqual(counts["test_a"]["switches"], 5)
+
+    def test_growth(self):
+        old = load(self.write("old.jsonl", 1))
+        new = load(self.write("new.jsonl", 3))
+        stream = Stream()
+        self.assertEqual(print_growth(old, new, stream), 1)
+        self.assertIn("switches +2", "".join(stream.parts))
+        self.assertEqual(print_growth(new, old, Stream()), 0)
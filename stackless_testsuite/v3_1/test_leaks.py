@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+from __future__ import absolute_import, print_function, division
+
+from stackless_testsuite.util import StacklessTestCase
+from stackless_testsuite.leaks import LeakDetector, slope, growing
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1"  # @ReservedAssignment
+
+REPEAT = 5
+
+# the leaking test body appends to this list
+LEAKED = []
+
+
+def leaking():
+    LEAKED.append([0] * 10000)
+
+
+def clean():
+    garbage = [0] * 10000  # @UnusedVariable
+
+
+class TestLeakDetector(StacklessTestCase):
+
+    def detect(self, body):
+        detector = LeakDetector(repeat=REPEAT, threshold=1024)
+        detector.start()
+        try:
+            for i in range(REPEAT):  # @UnusedVariable
+                body()
+                detector.sample()
+        finally:
+            detector.stop()
+        return detector.check()
+
+    def test_leaking(self):
+        self.addCleanup(LEAKED.__delitem__, slice(None))
+        leak = self.detect(leaking)
+        self.assertIsNotNone(leak)
+        self.assertTrue(leak.startswith("Leak:"), leak)
+
+    def test_clean(self):
+        self.assertIsNone(self.detect(clean))
+
+    def test_slope(self):
+        self.assertAlmostEqual(slope([1, 2, 3]), 1.0)
+        self.assertAlmostEqual(slope([0, 2, 4, 6]), 2.0)
+        self.assertAlmostEqual(slope([5, 5, 5, 5]), 0.0)
+        self.assertAlmostEqual(slope([3, 2, 1]), -1.0)
+
+    def test_growing(self):
+        self.assertTrue(growing([1, 2, 3]))
+        self.assertFalse(growing([1, 1, 2]))
+        self.assertFalse(growing([3, 2, 4]))
+        self.assertTrue(growing([1]))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+from __future__ import absolute_import, print_function, division
+
+from stackless_testsuite.util import StacklessTestCase
+from stackless_testsuite.store import t_quantile, compare, select
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1"  # @ReservedAssignment
+
+BASE = [1.0, 1.01, 0.99, 1.0, 1.02]
+
+
+def make_record(run_id, samples, name="bench", revision=None):
+    return {"run": run_id, "kind": "benchmark", "name": name, "params": {},
+            "samples": samples, "env": {"revision": revision}}
+
+
+class TestStatistics(StacklessTestCase):
+
+    def test_t_quantile(self):
+        # values from a table of Student's t distribution
+        self.assertAlmostEqual(t_quantile(0.95, 1), 12.706, places=3)
+        self.assertAlmostEqual(t_quantile(0.95, 4), 2.776, places=3)
+        self.assertAlmostEqual(t_quantile(0.99, 10), 3.169, places=3)
+
+    def test_compare_slower(self):
+        slower = [1.5 * x for x in BASE]
+        results = compare([make_record("a", BASE)], [make_record("b", slower)])
+        self.assertEqual(len(results), 1)
+        r = results[0]
+        self.assertAlmostEqual(r["ratio"], 1.5)
+        self.assertLess(r["p"], 0.01)
+        self.assertTrue(r["regression"])
+
+    def test_compare_identical(self):
+        results = compare([make_record("a", BASE)], [make_record("b", list(BASE))])
+        r = results[0]
+        self.assertAlmostEqual(r["ratio"], 1.0)
+        self.assertFalse(r["regression"])
+        self.assertFalse(r["suspect"])
+
+
+class TestSelect(StacklessTestCase):
+
+    def setUp(self):
+        super(TestSelect, self).setUp()
+        self.records = [make_record("run1", [1.0], revision="abc"),
+                        make_record("run2", [2.0], revision="def"),
+                        make_record("run2", [2.0], name="other", revision="def"),
+                        make_record("run3", [3.0], revision="abc"),
+                        ]
+
+    def test_latest_previous(self):
+        self.assertEqual(select(self.records, "latest"), self.records[3:])
+        self.assertEqual(select(self.records, "previous"), self.records[1:3])
+
+    def test_run_and_revision(self):
+        self.assertEqual(select(self.records, "run2"), self.records[1:3])
+        self.assertEqual(select(self.records, "abc"), [self.records[0], self.records[3]])
+
+    def test_no_match(self):
+        self.assertRaises(ValueError, select, self.records, "unknown")
+        self.assertRaises(ValueError, select, self.records[:1], "previous")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Stress tests with many tasklets
+
+These tests are skipped unless the environment variable
+STACKLESS_TESTSUITE_STRESS is set to the number of tasklets to use,
+i.e. STACKLESS_TESTSUITE_STRESS=1000000.
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import stackless
+from stackless_testsuite.util import StacklessTestCase, STRESS_SIZE, require_stress, kill_scheduled_tasklets
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1"  # @ReservedAssignment
+
+try:
+    xrange
+except NameError:
+    xrange = range  # @ReservedAssignment
+
+
+def nop():
+    pass
+
+
+def wait(channel):
+    channel.receive()
+
+
+@require_stress
+class TestRunQueue(StacklessTestCase):
+    """Put STRESS_SIZE tasklets into the run queue"""
+
+    def setUp(self):
+        super(TestRunQueue, self).setUp()
+        tasklet = stackless.tasklet
+        self.tasklets = [tasklet(nop)() for i in xrange(STRESS_SIZE)]
+
+    def tearDown(self):
+        del self.tasklets
+        super(TestRunQueue, self).tearDown()
+
+    def testRunCount(self):
+        self.assertEqual(stackless.getruncount(), STRESS_SIZE + 1)
+        self.tasklets[-1].remove()
+        self.assertEqual(stackless.getruncount(), STRESS_SIZE)
+        self.tasklets[-1].insert()
+        self.assertEqual(stackless.getruncount(), STRESS_SIZE + 1)
+
+    def testTraverseNext(self):
+        main = stackless.getmain()
+        current = main.next
+        for t in self.tasklets:
+            self.assertIs(current, t)
+            current = current.next
+        self.assertIs(current, main)
+
+    def testTraversePrev(self):
+        main = stackless.getmain()
+        current = main.prev
+        for t in reversed(self.tasklets):
+            self.assertIs(current, t)
+            current = current.prev
+        self.assertIs(current, main)
+
+    def testRun(self):
+        stackless.run()
+        self.assertEqual(stackless.getruncount(), 1)
+        self.assertFalse(any(t.alive for t in self.tasklets))
+
+    def testKill(self):
+        # the loop in StacklessTestCase.tearDown
+        kill_scheduled_tasklets()
+        self.assertEqual(stackless.getruncount(), 1)
+        self.assertFalse(any(t.alive for t in self.tasklets))
+
+
+@require_stress
+class TestChannel(StacklessTestCase):
+    """Block STRESS_SIZE tasklets on a single channel"""
+
+    def setUp(self):
+        super(TestChannel, self).setUp()
+        self.channel = stackless.channel()
+        tasklet = stackless.tasklet
+        self.tasklets = [tasklet(wait)(self.channel) for i in xrange(STRESS_SIZE)]
+        stackless.run()
+
+    def tearDown(self):
+        for t in self.tasklets:
+            t.kill()
+        del self.tasklets
+        super(TestChannel, self).tearDown()
+
+    def testBalance(self):
+        self.assertEqual(stackless.getruncount(), 1)
+        self.assertEqual(self.channel.balance, -STRESS_SIZE)
+        self.assertTrue(all(t.blocked for t in self.tasklets))
+
+    def testSend(self):
+        self.channel.preference = 0
+        for i in xrange(STRESS_SIZE):
+            self.channel.send(i)
+        self.assertEqual(self.channel.balance, 0)
+        self.assertEqual(stackless.getruncount(), STRESS_SIZE + 1)
+        stackless.run()
+        self.assertFalse(any(t.alive for t in self.tasklets))
+
+    def testSendSequence(self):
+        self.channel.preference = 1
+        self.assertEqual(self.channel.send_sequence(xrange(STRESS_SIZE)), STRESS_SIZE)
+        self.assertEqual(self.channel.balance, 0)
+        self.assertEqual(stackless.getruncount(), STRESS_SIZE + 1)
+        stackless.run()
+        self.assertFalse(any(t.alive for t in self.tasklets))
+
+    def testKill(self):
+        for t in self.tasklets:
+            t.kill()
+        self.assertEqual(self.channel.balance, 0)
+
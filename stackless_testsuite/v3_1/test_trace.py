@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 by Anselm Kruis
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from __future__ import absolute_import, print_function, division
+
+import os
+import random
+import shutil
+import tempfile
+import stackless
+from stackless_testsuite.util import StacklessTestCase
+from stackless_testsuite.trace import Session, load, expand
+
+if __name__ == '__main__':
+    import stackless_testsuite.v3_1  # @NoMove @UnusedImport
+    __package__ = "stackless_testsuite.v3_1"  # @ReservedAssignment
+
+try:
+    xrange  # @UndefinedVariable
+except NameError:
+    xrange = range  # @ReservedAssignment
+
+
+def workload(extra=0):
+    """a random channel chain, preempted by the watchdog"""
+    c = stackless.channel()
+    n = random.randint(10, 100)
+
+    def sender():
+        for i in xrange(n + extra):
+            c.send(i)
+
+    def receiver():
+        for i in xrange(n + extra):  # @UnusedVariable
+            c.receive()
+
+    stackless.tasklet(sender)()
+    stackless.tasklet(receiver)()
+    while True:
+        interrupted = stackless.run(100)
+        if interrupted is None:
+            break
+        interrupted.insert()
+
+
+class TestTrace(StacklessTestCase):
+
+    def setUp(self):
+        super(TestTrace, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "trace.jsonl")
+
+    def record(self):
+        with Session(self.path, "workload", "record"):
+            workload()
+        return load(self.path)["workload"]
+
+    def test_record(self):
+        trace = self.record()
+        self.assertIsInstance(trace["seed"], int)
+        self.assertTrue(expand(trace["events"]))
+
+    def test_replay(self):
+        self.record()
+        with Session(self.path, "workload", "replay") as session:
+            workload()
+        self.assertIsNone(session.divergence())
+        session.check()
+
+    def test_divergence(self):
+        self.record()
+        with Session(self.path, "workload", "replay") as session:
+            workload(extra=1)
+        self.assertIsNotNone(session.divergence())
+        self.assertRaises(AssertionError, session.check)
+
+    def test_no_trace(self):
+        self.record()
+        with Session(self.path, "other", "replay") as session:
+            workload()
+        self.assertIsNone(session.divergence())